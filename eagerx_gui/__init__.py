@@ -1,97 +1,100 @@
 __version__ = "0.2.15"
 
 import os
+import sys
+from importlib.util import find_spec
 
-# Set PyQt backend
+# Set PyQt backend, without importing it. Qt is only imported when the gui is used, so that e.g. eagerx_gui.svg can be
+# used without Qt.
 for lib in ["PyQt6", "PyQt5"]:
-    try:
-        __import__(lib)
+    if find_spec(lib) is not None:
         os.environ["PYQTGRAPH_QT_LIB"] = lib
         break
-    except ImportError:
-        pass
-
-import pyqtgraph as pg
-import pyqtgraph.exporters
-import sys
-import numpy as np
-from pyqtgraph.Qt import QtWidgets, QtGui
-from eagerx_gui.gui import Gui
 
+from eagerx_gui.svg import state_to_svg, write_svg  # noqa: F401
+from eagerx_gui.worker import AsyncRenderer  # noqa: F401
 
-def launch_gui(state, is_engine=False):
-    app = QtWidgets.QApplication(sys.argv)
-
-    ## Create main window with grid layout
-    win = QtWidgets.QMainWindow()
-    win.setWindowTitle("EAGERx Graph")
-    cw = QtWidgets.QWidget()
-    win.setCentralWidget(cw)
-    layout = QtWidgets.QGridLayout()
-    cw.setLayout(layout)
-
-    rx_gui = Gui(state, is_engine=is_engine)
-    w = rx_gui.widget()
 
-    # Add flowchart control panel to the main window
-    layout.addWidget(w, 0, 0, 2, 1)
+def __getattr__(name):
+    if name == "Gui":
+        from eagerx_gui.gui import Gui
 
-    win.show()
+        return Gui
+    elif name in ["RenderSession", "get_render_session"]:
+        from eagerx_gui import render
 
-    app.exec()
-    state["gui_state"] = rx_gui.graph._state["gui_state"]
-    app.quit()
-    return state
+        return getattr(render, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-def render_gui(state, resolution=None, is_engine=False, filename=None):
-    if resolution is not None:
-        assert (
-            type(resolution) is list or type(resolution) is np.ndarray
-        ), f"Invalid type for argument resolution. Should be list or ndarray, but is {type(resolution)}."
-        assert len(resolution) == 2, f"Invalid length argument resolution. Should be 2, but is {len(resolution)}."
-    else:
-        resolution = [1920, 1080]
+def launch_gui(state, is_engine=False, layout="spring", incremental=False, workers=None, lod_threshold=0.5):
+    from pyqtgraph.Qt import QtWidgets
+    from eagerx_gui.gui import Gui
 
-    app = QtWidgets.QApplication(sys.argv)
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
 
     ## Create main window with grid layout
     win = QtWidgets.QMainWindow()
     win.setWindowTitle("EAGERx Graph")
     cw = QtWidgets.QWidget()
     win.setCentralWidget(cw)
-    layout = QtWidgets.QGridLayout()
-    cw.setLayout(layout)
+    grid_layout = QtWidgets.QGridLayout()
+    cw.setLayout(grid_layout)
 
-    rx_gui = Gui(state, is_engine=is_engine)
+    rx_gui = Gui(
+        state, is_engine=is_engine, layout=layout, incremental=incremental, workers=workers, lod_threshold=lod_threshold
+    )
     w = rx_gui.widget()
 
     # Add flowchart control panel to the main window
-    layout.addWidget(w, 0, 0, 2, 1)
+    grid_layout.addWidget(w, 0, 0, 2, 1)
 
     win.show()
 
-    if filename is not None:
-        if not filename.endswith(".svg"):
-            filename += ".svg"
-        svgexporter = pg.exporters.SVGExporter(w.view.scene())
-        svgexporter.export(filename)
-
-    exporter = pg.exporters.ImageExporter(w.view.scene())
-    exporter.parameters()["width"] = resolution[0]
-    exporter.parameters()["height"] = resolution[1]
-
-    png = exporter.export(toBytes=True)
-    png.convertToFormat(QtGui.QImage.Format.Format_RGB32)
+    app.exec()
+    state["gui_state"] = rx_gui.graph._state["gui_state"]
+    app.quit()
+    return state
 
-    width = png.width()
-    height = png.height()
 
-    ptr = png.bits()
-    ptr.setsize(height * width * 4)
-    arr = np.array(ptr).reshape(height, width, 4)  # Copies the data
-    app.quit()
-    return arr[..., [2, 1, 0, 3]]
+def render_gui(
+    state,
+    resolution=None,
+    is_engine=False,
+    filename=None,
+    layout="spring",
+    incremental=False,
+    workers=None,
+    rgb=False,
+    out=None,
+    tile_size=None,
+    cache=None,
+):
+    from eagerx_gui.render import get_render_session
+
+    session = get_render_session()
+    return session.render(
+        state,
+        resolution=resolution,
+        is_engine=is_engine,
+        filename=filename,
+        layout=layout,
+        incremental=incremental,
+        workers=workers,
+        rgb=rgb,
+        out=out,
+        tile_size=tile_size,
+        cache=cache,
+    )
+
+
+def render_many(jobs, stack=False, layout="spring", incremental=False, workers=None, rgb=False, cache=None):
+    from eagerx_gui.render import get_render_session
+
+    session = get_render_session()
+    return session.render_many(
+        jobs, stack=stack, layout=layout, incremental=incremental, workers=workers, rgb=rgb, cache=cache
+    )
 
 
 def launch_engine_gui(state):
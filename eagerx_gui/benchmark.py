@@ -0,0 +1,195 @@
+"""
+Benchmark of the layout of synthetic graphs.
+
+Run with ``python -m eagerx_gui.benchmark --output report.json``. See ``--help`` for the available options.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from copy import deepcopy
+
+import networkx as nx
+import numpy as np
+
+from eagerx_gui import __version__
+from eagerx_gui.utils import add_pos_to_state, get_adjacency, get_longest_shortest_simple_paths
+
+
+def _get_fixed_nodes(is_engine):
+    return ("actuators", "sensors") if is_engine else ("env/actions", "env/observations")
+
+
+def _create_state(names, edges):
+    nodes = {name: dict(config=dict(name=name)) for name in names}
+    connects = []
+    for i, (source, target) in enumerate(edges):
+        connects.append([[source, "outputs", f"out_{i}"], [target, "inputs", f"in_{i}"]])
+    return dict(nodes=nodes, connects=connects, gui_state=dict())
+
+
+def chain_state(num_nodes, is_engine=False):
+    """Nodes connected one after the other, from the actions (actuators) to the observations (sensors)."""
+    left, right = _get_fixed_nodes(is_engine)
+    names = [f"node_{i}" for i in range(num_nodes)]
+    path = [left] + names + [right]
+    return _create_state([left, right] + names, list(zip(path[:-1], path[1:])))
+
+
+def fan_state(num_nodes, is_engine=False):
+    """All nodes receive the actions (actuators) and are connected to the observations (sensors)."""
+    left, right = _get_fixed_nodes(is_engine)
+    names = [f"node_{i}" for i in range(num_nodes)]
+    edges = [(left, name) for name in names] + [(name, right) for name in names]
+    return _create_state([left, right] + names, edges)
+
+
+def feedback_state(num_nodes, is_engine=False):
+    """Chain of nodes, where every third node also feeds back into the node two positions before it."""
+    state = chain_state(num_nodes, is_engine=is_engine)
+    for i in range(2, num_nodes, 3):
+        j = len(state["connects"])
+        state["connects"].append([[f"node_{i}", "outputs", f"out_{j}"], [f"node_{i - 2}", "inputs", f"in_{j}"]])
+    return state
+
+
+def clusters_state(num_nodes, is_engine=False, cluster_size=5):
+    """A short chain between the fixed nodes, plus many chains that are not connected to the fixed nodes."""
+    left, right = _get_fixed_nodes(is_engine)
+    names = [f"node_{i}" for i in range(num_nodes)]
+    edges = [(left, names[0]), (names[0], right)] if num_nodes > 0 else [(left, right)]
+    for i in range(1, num_nodes):
+        if (i - 1) % cluster_size != 0:
+            edges.append((names[i - 1], names[i]))
+    return _create_state([left, right] + names, edges)
+
+
+GENERATORS = {
+    "chain": chain_state,
+    "fan": fan_state,
+    "feedback": feedback_state,
+    "clusters": clusters_state,
+}
+
+
+def _measure(fn, repeats):
+    # Best wall-clock time of repeats, followed by a separate run to measure the peak memory (which slows down execution)
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(durations), peak
+
+
+def run_benchmark(
+    sizes=(10, 100, 1000, 3000),
+    generators=tuple(GENERATORS.keys()),
+    layouts=("spring", "force", "layered"),
+    is_engine=False,
+    repeats=1,
+    spring_max_nodes=1000,
+    workers=None,
+):
+    """
+    Times each layout phase on synthetic graphs and records the peak memory that was allocated.
+
+    :param sizes: Number of nodes (excluding the fixed nodes) of the generated graphs.
+    :param generators: Names of the graph generators in :data:`GENERATORS`.
+    :param layouts: Layouts to pass to :func:`eagerx_gui.utils.add_pos_to_state`.
+    :param is_engine: Generate engine graphs (actuators, sensors) instead of environment graphs.
+    :param repeats: Number of timed runs of each phase, of which the fastest is reported.
+    :param spring_max_nodes: Largest graph that is laid out with the (slow) "spring" layout.
+    :param workers: Number of processes, or an executor, that lay out loose clusters in parallel with the "spring" layout.
+    :return: Dict with the environment and a list of results, with one entry per graph and phase.
+    """
+    results = []
+    # Executors are recorded by their type, so that the report remains serializable
+    workers_info = workers if workers is None or isinstance(workers, int) else type(workers).__name__
+    fixed_nodes = set(_get_fixed_nodes(is_engine))
+    for generator in generators:
+        for size in sizes:
+            state = GENERATORS[generator](size, is_engine=is_engine)
+            adjacency = get_adjacency(state)
+            phases = [
+                ("adjacency", lambda: get_adjacency(state)),
+                (
+                    "longest_paths",
+                    lambda: get_longest_shortest_simple_paths(state, fixed_nodes=fixed_nodes, adjacency=adjacency),
+                ),
+            ]
+            for layout in layouts:
+                if layout == "spring" and size > spring_max_nodes:
+                    continue
+                phases.append(
+                    (
+                        f"layout/{layout}",
+                        lambda layout=layout: add_pos_to_state(
+                            deepcopy(state), is_engine=is_engine, layout=layout, workers=workers, cache=False
+                        ),
+                    )
+                )
+            for phase, fn in phases:
+                duration, peak_memory = _measure(fn, repeats)
+                results.append(
+                    dict(
+                        generator=generator,
+                        num_nodes=len(state["nodes"]),
+                        num_connects=len(state["connects"]),
+                        is_engine=is_engine,
+                        workers=workers_info,
+                        phase=phase,
+                        time=duration,
+                        peak_memory=peak_memory,
+                    )
+                )
+    environment = dict(
+        eagerx_gui=__version__,
+        python=platform.python_version(),
+        numpy=np.__version__,
+        networkx=nx.__version__,
+        platform=platform.platform(),
+    )
+    return dict(environment=environment, results=results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the layout of synthetic EAGERx graphs.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 3000], help="Number of nodes per graph.")
+    parser.add_argument("--generators", nargs="+", default=list(GENERATORS.keys()), choices=list(GENERATORS.keys()))
+    parser.add_argument("--layouts", nargs="+", default=["spring", "force", "layered"])
+    parser.add_argument("--engine", action="store_true", help="Generate engine graphs instead of environment graphs.")
+    parser.add_argument("--repeats", type=int, default=1, help="Number of timed runs per phase.")
+    parser.add_argument("--spring-max-nodes", type=int, default=1000, help="Largest graph laid out with 'spring'.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes for the 'spring' layout.")
+    parser.add_argument("--output", default=None, help="Json file to write the report to (default: stdout).")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(
+        sizes=args.sizes,
+        generators=args.generators,
+        layouts=args.layouts,
+        is_engine=args.engine,
+        repeats=args.repeats,
+        spring_max_nodes=args.spring_max_nodes,
+        workers=args.workers,
+    )
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+
+def get_layout_key(state, is_engine=False, **params):
+    """
+    Hash of everything that determines the layout of a graph, i.e. the node names, the connections, the prescribed node
+    positions and the parameters of the layout algorithm. The hash does not depend on the order of nodes and connections.
+    """
+    nodes = sorted(state["nodes"].keys())
+    connects = sorted([list(source), list(target)] for source, target in state["connects"])
+    prescribed = []
+    for node in nodes:
+        gui_state = state["gui_state"].get(node, dict())
+        if gui_state.get("pos", None) is not None and len(gui_state["pos"]) == 2:
+            prescribed.append([node, [float(value) for value in gui_state["pos"]]])
+    data = dict(nodes=nodes, connects=connects, pos=prescribed, is_engine=is_engine, params=params)
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def get_render_key(state, is_engine=False, **params):
+    """
+    Hash of everything that determines the rendered image of a graph, i.e. the nodes (including their config), the
+    connections, the gui state (node positions and line styles) and the render parameters, e.g. the resolution.
+
+    Connections without a line style are drawn as cubic curves, so "cubic" line styles do not change the hash.
+    """
+    gui_state = dict()
+    for node, node_gui_state in state.get("gui_state", dict()).items():
+        linestyle = {key: value for key, value in node_gui_state.get("linestyle", dict()).items() if value != "cubic"}
+        gui_state[node] = dict(node_gui_state, linestyle=linestyle)
+    data = dict(
+        nodes=state["nodes"],
+        connects=sorted([list(source), list(target)] for source, target in state["connects"]),
+        gui_state=gui_state,
+        is_engine=is_engine,
+        params=params,
+    )
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Cache(object):
+    """
+    Least recently used cache in memory, optionally backed by a directory with one file per entry.
+
+    :param maxsize: Maximum number of entries kept in memory.
+    :param directory: If provided, entries are also stored in this directory, such that they can be reused by other
+                      processes.
+    :param max_files: Maximum number of entries kept in the directory. The least recently used files are removed first.
+    """
+
+    extension = None
+
+    def __init__(self, maxsize=128, directory=None, max_files=1024):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.max_files = max_files
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        if self.directory is not None:
+            self.directory = os.path.expanduser(self.directory)
+            os.makedirs(self.directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the value stored for key, or None if there is none."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        value = self._load(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._store(key, value)
+        return value
+
+    def put(self, key, value):
+        """Store value for key."""
+        value = self._prepare(value)
+        self._store(key, value)
+        self._save(key, value)
+        return value
+
+    def clear(self):
+        """Remove all entries from memory (files in the directory are kept)."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, size=len(self._entries))
+
+    def _prepare(self, value):
+        return value
+
+    def _read(self, f):
+        raise NotImplementedError
+
+    def _write(self, f, value):
+        raise NotImplementedError
+
+    def _store(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}{self.extension}")
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = self._read(f)
+        except (OSError, ValueError, KeyError):
+            return None
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            pass
+        return value
+
+    def _save(self, key, value):
+        if self.directory is None:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            self._write(f, value)
+        os.replace(tmp_path, path)
+        files = [os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith(self.extension)]
+        if self.max_files is not None and len(files) > self.max_files:
+            files.sort(key=_get_mtime)
+            for file in files[: len(files) - self.max_files]:
+                try:
+                    os.remove(file)
+                except OSError:
+                    pass
+
+
+class LayoutCache(Cache):
+    """
+    Least recently used cache with node positions, keyed by :func:`get_layout_key`. Values are dicts with the position of
+    each node. See :class:`Cache` for the parameters.
+    """
+
+    extension = ".json"
+
+    def _prepare(self, positions):
+        return {node: [float(value) for value in pos] for node, pos in positions.items()}
+
+    def _read(self, f):
+        return json.loads(f.read().decode())
+
+    def _write(self, f, positions):
+        f.write(json.dumps(positions).encode())
+
+
+class RenderCache(Cache):
+    """
+    Least recently used cache with rendered images, keyed by :func:`get_render_key`. Values are tuples (image, svg), with
+    the image as a read-only array and the contents of the exported svg file (or None). Stored images are made read-only,
+    so the cache should own them, and only hand out copies. See :class:`Cache` for the parameters. Images are stored as
+    ``.npz`` files in the directory.
+    """
+
+    extension = ".npz"
+
+    def __init__(self, maxsize=16, directory=None, max_files=256):
+        super().__init__(maxsize=maxsize, directory=directory, max_files=max_files)
+
+    def _prepare(self, value):
+        image, svg = value
+        image = np.asarray(image)
+        image.setflags(write=False)
+        return image, svg
+
+    def _read(self, f):
+        with np.load(f) as data:
+            image = data["image"]
+            svg = data["svg"].tobytes() if "svg" in data else None
+        image.setflags(write=False)
+        return image, svg
+
+    def _write(self, f, value):
+        image, svg = value
+        arrays = dict(image=image) if svg is None else dict(image=image, svg=np.frombuffer(svg, dtype=np.uint8))
+        np.savez(f, **arrays)
+
+
+def _get_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+# Layouts are cached in memory by default. Set the environment variable EAGERX_GUI_LAYOUT_CACHE to a directory to also
+# share them between processes.
+_layout_cache = LayoutCache(directory=os.environ.get("EAGERX_GUI_LAYOUT_CACHE", None))
+
+
+def get_layout_cache():
+    """Return the layout cache that is used by default, or None if layouts are not cached by default."""
+    return _layout_cache
+
+
+def set_layout_cache(cache):
+    """Set the layout cache that is used by default. Set to None to disable caching by default."""
+    global _layout_cache
+    _layout_cache = cache
+
+
+# Rendered images are not cached by default, because every cached image is kept in memory. Set the environment variable
+# EAGERX_GUI_RENDER_CACHE to a directory, or call set_render_cache, to cache them by default.
+_render_cache = (
+    RenderCache(directory=os.environ["EAGERX_GUI_RENDER_CACHE"]) if "EAGERX_GUI_RENDER_CACHE" in os.environ else None
+)
+
+
+def get_render_cache():
+    """Return the render cache that is used by default, or None if images are not cached by default."""
+    return _render_cache
+
+
+def set_render_cache(cache):
+    """Set the render cache that is used by default. Set to None to disable caching by default."""
+    global _render_cache
+    _render_cache = cache
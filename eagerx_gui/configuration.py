@@ -1,3 +1,4 @@
+import functools
 from copy import deepcopy
 
 # Terminal types
@@ -12,6 +13,13 @@ TERMS = {
 TERMS_IN = set().union(*[TERMS[key]["in"] for key in TERMS])
 TERMS_OUT = set().union(*[TERMS[key]["out"] for key in TERMS])
 
+# Available layout algorithms for nodes without a prescribed position
+LAYOUTS = ["spring", "layered", "force"]
+
+# Level of detail: details that were hidden below the threshold are shown again above this factor times the threshold,
+# such that details do not flicker when zooming around the threshold.
+LOD_HYSTERESIS = 1.25
+
 # Possible entries in GUI
 GUI_WIDGETS = {
     "node": {
@@ -32,6 +40,17 @@ GUI_WIDGETS = {
     },
 }
 
+# Keys that are hidden, compiled from GUI_WIDGETS
+GUI_HIDE = {kind: {key: frozenset(value) for key, value in widgets["hide"].items()} for kind, widgets in GUI_WIDGETS.items()}
+
+
+@functools.lru_cache(maxsize=None)
+def get_hidden_keys(kind, *types):
+    """Keys that are hidden for a "node" or "term" of the given (node or terminal) types."""
+    hide = GUI_HIDE[kind]
+    return hide["all"].union(*[hide[t] for t in types if t in hide])
+
+
 # Corresponding RGB values for colors
 GUI_COLORS = {
     "black": [0, 0, 0],
@@ -2,8 +2,11 @@
  Adapted from https://github.com/pyqtgraph/pyqtgraph/blob/master/pyqtgraph/flowchart/Flowchart.py
 """
 
+import time
+
 # Import pyqtgraph modules
 from pyqtgraph.graphicsItems.GraphicsObject import GraphicsObject
+from pyqtgraph.GraphicsScene import GraphicsScene
 from pyqtgraph.Qt import QtCore, QtWidgets
 from pyqtgraph import dockarea
 from pyqtgraph.debug import printExc
@@ -17,20 +20,90 @@ from eagerx_gui import configuration
 from eagerx_gui.utils import add_pos_to_state
 from eagerx_gui import gui_view
 from eagerx_gui.gui_node import RxGuiNode, NodeGraphicsItem
-from eagerx_gui.gui_terminal import TerminalGraphicsItem, ConnectionItem
+from eagerx_gui.gui_terminal import TerminalGraphicsItem, ConnectionItem, ConnectionBatch
 
 
 class Gui(QtCore.QObject):
-    def __init__(self, state, is_engine=False):
+    """
+    Graphical representation of an (engine) graph.
+
+    If headless, only the scene with the nodes, terminals and connections is created, without any widgets.
+    This is sufficient to render the graph, e.g. with :func:`eagerx_gui.render.render_scene`.
+
+    With a lod_threshold, i.e. a scale in pixels per unit of the scene, names, labels and terminal boxes are hidden and
+    connections are drawn as straight lines when zoomed out below the threshold.
+
+    With batch_connections, connections are drawn together by a :class:`eagerx_gui.gui_terminal.ConnectionBatch`, which
+    is faster for graphs with many connections.
+
+    While nodes are dragged, their moves are coalesced: connections are updated at most once per drag_interval (in ms),
+    and positions are written to the state when the drag finishes, or at most once per state_interval (in ms) if it is
+    not None. Moves that are not made by dragging are applied immediately.
+
+    For large graphs, the scene can be tuned with:
+
+    - scene_index: "bsp" to index the items of the scene with a BSP tree of depth bsp_depth (0 selects the depth
+      automatically), or "none" to not index them at all. Items are never indexed while a state is loaded.
+    - cull_connections: Hide connections outside of the view box, so that they are neither painted nor hit-tested.
+    - cache_nodes: Cache the boxes of the nodes in pixmaps, in device coordinates.
+    """
+
+    def __init__(
+        self,
+        state,
+        is_engine=False,
+        layout="spring",
+        incremental=False,
+        workers=None,
+        headless=False,
+        lod_threshold=None,
+        batch_connections=False,
+        drag_interval=16,
+        state_interval=None,
+        scene_index="bsp",
+        bsp_depth=0,
+        cull_connections=False,
+        cache_nodes=False,
+    ):
         super().__init__()
+        assert scene_index in ["bsp", "none"], f"Invalid scene index: {scene_index}. Should be 'bsp' or 'none'."
         self.graph = Graph(state=state) if not is_engine else EngineGraph(state=state)
         self.is_engine = is_engine
+        self.layout = layout
+        self.incremental = incremental
+        self.workers = workers
+        self.headless = headless
         self.nodes = {}
         self.next_z_val = 10
+        self.loading = False
+        self.lod_threshold = lod_threshold
+        self.detailed = True
+        self.batch_connections = batch_connections
+        self.connection_batch = None
+        self.drag_interval = drag_interval
+        self.state_interval = state_interval
+        self.dragging = False
+        self._moved_items = {}  # Used as ordered sets of node items
+        self._unsaved_items = {}
+        self._last_state_write = 0.0
+        self._move_timer = QtCore.QTimer(self)
+        self._move_timer.setSingleShot(True)
+        self._move_timer.timeout.connect(self.flush_moves)
+        self.scene_index = scene_index
+        self.bsp_depth = bsp_depth
+        self.cull_connections = cull_connections
+        self.cache_nodes = cache_nodes
         self._widget = None
         self.scene = None
         self.file_path = None
-        self.widget()
+        if headless:
+            self.create_scene()
+        else:
+            self.widget()
+        self.viewBox.sigRangeChanged.connect(self.update_lod)
+        self.viewBox.sigResized.connect(self.update_lod)
+        self.viewBox.sigRangeChanged.connect(self.update_culling)
+        self.viewBox.sigResized.connect(self.update_culling)
         self.load_state()
         self.viewBox.autoRange(padding=0.04)
 
@@ -50,7 +123,10 @@ class Gui(QtCore.QObject):
         if type(pos) in [QtCore.QPoint, QtCore.QPointF]:
             pos = [pos.x(), pos.y()]
         item = node.graphics_item()
-        item.setZValue(self.next_z_val * 2)
+        item.initial_z_value = self.next_z_val * 2
+        item.setZValue(item.initial_z_value)
+        if self.cache_nodes:
+            item.setCacheMode(item.CacheMode.DeviceCoordinateCache)
         self.next_z_val += 1
         self.viewBox.addItem(item)
         item.moveBy(*pos)
@@ -59,7 +135,15 @@ class Gui(QtCore.QObject):
     def connect_terminals(self, term1, term2):
         """Connect two terminals together within this flowchart."""
         connection_item = ConnectionItem(term1.graphics_item(), term2.graphics_item())
-        term1.graphics_item().getViewBox().addItem(connection_item)
+        self.viewBox.addItem(connection_item)
+        if self.cull_connections:
+            connection_item.set_cull_rect(self.get_cull_rect())
+        if self.batch_connections:
+            if self.connection_batch is None:
+                self.connection_batch = ConnectionBatch()
+                self.viewBox.addItem(self.connection_batch, ignoreBounds=True)
+                self.connection_batch.setZValue(connection_item.zValue())
+            self.connection_batch.add(connection_item)
 
         term1.connections[term2] = connection_item
         term2.connections[term1] = connection_item
@@ -81,19 +165,50 @@ class Gui(QtCore.QObject):
         This widget provides GUI access to the parameters for each node and a
         graphical representation of the flowchart.
         """
+        assert not self.headless, "A headless Gui has no widget."
         if self._widget is None:
             self._widget = EagerxGraphWidget(self)
             self.scene = self._widget.scene
             self.viewBox = self._widget.viewBox()
+            self.set_scene_index()
         return self._widget
 
+    def create_scene(self):
+        """Create the scene and view box that items are added to, without a view."""
+        self.scene = GraphicsScene()
+        self.viewBox = gui_view.RxViewBox(None, lockAspect=True, invertY=True)
+        self.scene.addItem(self.viewBox)
+        self.viewBox.setGeometry(QtCore.QRectF(0, 0, 1000, 600))
+        self.set_scene_index()
+
+    def set_scene_index(self):
+        """Set the index method of the scene, according to scene_index and bsp_depth."""
+        if self.scene_index == "bsp":
+            self.scene.setItemIndexMethod(QtWidgets.QGraphicsScene.ItemIndexMethod.BspTreeIndex)
+            self.scene.setBspTreeDepth(self.bsp_depth)
+        else:
+            self.scene.setItemIndexMethod(QtWidgets.QGraphicsScene.ItemIndexMethod.NoIndex)
+
     def load_state(self):
+        # Populate the scene in bulk. The scene index and the range of the view box are otherwise updated for every added
+        # item, and the terminals of a node are otherwise laid out again for every added terminal.
         self.blockSignals(True)
+        auto_range = self.viewBox.autoRangeEnabled()
+        self.scene.setItemIndexMethod(QtWidgets.QGraphicsScene.ItemIndexMethod.NoIndex)
+        self.viewBox.disableAutoRange()
+        self.loading = True
         try:
-            add_pos_to_state(self.graph._state, is_engine=self.is_engine)
+            add_pos_to_state(
+                self.graph._state,
+                is_engine=self.is_engine,
+                layout=self.layout,
+                incremental=self.incremental,
+                workers=self.workers,
+            )
             nodes = self.graph._state["nodes"]
             nodes = [dict(**node, name=name, gui_state=self.graph._state["gui_state"][name]) for name, node in nodes.items()]
             nodes.sort(key=lambda a: a["gui_state"]["pos"][0])
+            created = []
             for n in nodes:
                 if n["name"] in self.nodes:
                     self.nodes[n["name"]].load_state(n)
@@ -103,9 +218,14 @@ class Gui(QtCore.QObject):
                     pos = n["gui_state"]["pos"]
                     node = self.create_node(name, pos)
                     node.load_state(n)
+                    created.append(node)
                 except Exception:
                     printExc("Error creating node %s: (continuing anyway)" % n["name"])
 
+            # Lay out the terminals once, before the connections are created, such that each line is generated once
+            for node in created:
+                node.graphics_item().update_terminals()
+
             connects = [
                 (
                     connection[0][0],
@@ -123,9 +243,134 @@ class Gui(QtCore.QObject):
                     print(self.nodes[n2].terminals)
                     printExc("Error connecting terminals %s.%s - %s.%s:" % (n1, t1, n2, t2))
 
+            if not self.detailed:
+                self.set_detailed(False)
         finally:
+            self.loading = False
+            self.set_scene_index()
+            self.viewBox.enableAutoRange(x=auto_range[0], y=auto_range[1])
             self.blockSignals(False)
 
+    def set_state(self, state, is_engine=None):
+        """Replace the displayed graph by the graph in state, reusing the widget."""
+        if is_engine is not None:
+            self.is_engine = is_engine
+        self.graph = Graph(state=state) if not self.is_engine else EngineGraph(state=state)
+        self.clear()
+        self.load_state()
+        self.viewBox.autoRange(padding=0.04)
+
+    def clear(self):
+        """Remove all nodes and connections from the widget."""
+        view_box = self.viewBox
+        items = list(dict.fromkeys(view_box.addedItems + view_box.childGroup.childItems()))
+        view_box.addedItems.clear()  # Cleared at once, instead of searched and removed for every item
+        for item in items:
+            view_box.removeItem(item)
+        self.nodes = {}
+        self.next_z_val = 10
+        self.connection_batch = None
+        self._move_timer.stop()
+        self.dragging = False
+        self._moved_items = {}
+        self._unsaved_items = {}
+        if self._widget is not None:
+            self._widget.hoverItem = None
+            self._widget.set_hover_text("")
+
+    def schedule_move(self, item):
+        """Schedule the update of the connections and state of a dragged node item, together with other moves."""
+        self._moved_items[item] = None
+        self._unsaved_items[item] = None
+        if not self._move_timer.isActive():
+            self._move_timer.start(self.drag_interval)
+
+    def flush_moves(self, write_state=False):
+        """
+        Update the connections of the node items that were moved since the last flush, each connection only once.
+
+        :param write_state: Write the positions to the state. Otherwise, they are only written if the state_interval passed.
+        """
+        self._move_timer.stop()
+        connections = {}
+        for item in self._moved_items:
+            for term, _ in item.terminals.values():
+                connections.update(dict.fromkeys(term.connections.values()))
+        self._moved_items = {}
+        for connection in connections:
+            connection.update_line()
+        now = time.monotonic()
+        if not write_state and self.state_interval is not None:
+            write_state = (now - self._last_state_write) * 1000 >= self.state_interval
+        if write_state:
+            for item in self._unsaved_items:
+                item.write_pos()
+            self._unsaved_items = {}
+            self._last_state_write = now
+
+    def finish_drag(self):
+        """Apply all pending moves when a drag finishes."""
+        self.dragging = False
+        self.flush_moves(write_state=True)
+
+    def update_lod(self, *args):
+        """Show or hide the details of the graph, depending on the scale of the view box and the lod_threshold."""
+        if self.lod_threshold is None:
+            detailed = True
+        else:
+            # Scene coordinates of the view box are pixels, also if it is headless (i.e. without a view)
+            view_width = self.viewBox.viewRect().width()
+            if not view_width > 0 or not self.viewBox.width() > 0:
+                return
+            threshold = self.lod_threshold if self.detailed else self.lod_threshold * configuration.LOD_HYSTERESIS
+            detailed = self.viewBox.width() / view_width >= threshold
+        if detailed != self.detailed:
+            self.set_detailed(detailed)
+
+    def set_detailed(self, detailed):
+        """Show or hide names, labels and terminal boxes, and draw connections as straight lines if not detailed."""
+        self.detailed = detailed
+        for node in self.nodes.values():
+            node.graphics_item().set_detailed(detailed)
+        for connection in self.get_connections():
+            connection.set_detailed(detailed)
+
+    def get_connections(self):
+        """All connection items, without duplicates."""
+        connections = {}
+        for node in self.nodes.values():
+            for term in node.terminals.values():
+                connections.update(dict.fromkeys(term.connections.values()))
+        return list(connections)
+
+    def get_cull_rect(self):
+        """The rect of the view box outside of which connections are hidden, in the coordinates of the connections."""
+        rect = self.viewBox.viewRect()
+        if self.viewBox.width() > 0:
+            # Margin for the width of the pens, which are cosmetic
+            margin = 4 * rect.width() / self.viewBox.width()
+            rect = rect.adjusted(-margin, -margin, margin, margin)
+        return rect
+
+    def update_culling(self, *args):
+        """Hide the connections outside of the view box, if cull_connections."""
+        if not self.cull_connections:
+            return
+        rect = self.get_cull_rect()
+        for connection in self.get_connections():
+            connection.set_cull_rect(rect)
+
+    def invalidate_params(self, name=None):
+        """
+        Invalidate the cached params of the nodes and terminals, after their specs were modified in the graph.
+
+        :param name: Name of the node to invalidate, or None to invalidate all nodes.
+        """
+        nodes = self.nodes.values() if name is None else [self.nodes[name]]
+        for node in nodes:
+            node.invalidate_params()
+            node.graphics_item().set_color()
+
     def tuple_to_view(self, t):
         if isinstance(t, tuple):
             t = list(t)
@@ -159,6 +404,7 @@ class EagerxGraphWidget(dockarea.DockArea):
         self.cwWin.setCentralWidget(self)
         self.cwWin.resize(1000, 800)
         self.hoverItem = None
+        self._hover_text = ""
 
         # build user interface (it was easier to do it here than via developer)
         self.view = gui_view.RxView(self)
@@ -189,36 +435,19 @@ class EagerxGraphWidget(dockarea.DockArea):
 
     def hover_over(self, items):
         for item in items:
-            self.hoverItem = item
-            if hasattr(item, "term") and isinstance(item, TerminalGraphicsItem):
-                text = "name: " + item.term.terminal_name
-                for key, value in item.term.params().items():
-                    if key in configuration.GUI_WIDGETS["term"]["hide"]["all"]:
-                        continue
-                    elif (
-                        item.term.node_type in configuration.GUI_WIDGETS["term"]["hide"]
-                        and key in configuration.GUI_WIDGETS["term"]["hide"][item.term.node_type]
-                    ):
-                        continue
-                    elif (
-                        item.term.terminal_type in configuration.GUI_WIDGETS["term"]["hide"]
-                        and key in configuration.GUI_WIDGETS["term"]["hide"][item.term.terminal_type]
-                    ):
-                        continue
-                    text += "\n" + "{}: {}".format(key, value)
-                self.hoverText.setPlainText(text)
-                return
-            elif hasattr(item, "node") and isinstance(item, NodeGraphicsItem):
-                text = ""
-                for key, value in item.node.params().items():
-                    if key in configuration.GUI_WIDGETS["node"]["hide"]["all"]:
-                        continue
-                    elif (
-                        item.node.node_type in configuration.GUI_WIDGETS["node"]["hide"]
-                        and key in configuration.GUI_WIDGETS["node"]["hide"][item.node.node_type]
-                    ):
-                        continue
-                    text += "{}: {}\n".format(key, value)
-                self.hoverText.setPlainText(text)
-                return
-        self.hoverText.setPlainText("")
+            if isinstance(item, TerminalGraphicsItem):
+                text = item.term.hover_text()
+                break
+            elif isinstance(item, NodeGraphicsItem):
+                text = item.node.hover_text()
+                break
+        else:
+            item, text = None, ""
+        self.hoverItem = item
+        self.set_hover_text(text)
+
+    def set_hover_text(self, text):
+        # Only updates the text widget if the text changed, because that is relatively slow
+        if text != self._hover_text:
+            self._hover_text = text
+            self.hoverText.setPlainText(text)
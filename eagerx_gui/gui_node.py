@@ -16,6 +16,9 @@ from collections import OrderedDict
 
 translate = QtCore.QCoreApplication.translate
 
+# Instrumentation: if not None, e.g. a collections.Counter, the paints of every node are counted per name of the node
+paint_counter = None
+
 
 class RxGuiNode(QtCore.QObject):
     sigTerminalAdded = QtCore.Signal(object, object)  # self, term
@@ -29,6 +32,8 @@ class RxGuiNode(QtCore.QObject):
         self.outputs = OrderedDict()
         self.gui = gui
         self.spec = self.gui.graph.get_spec(name).config
+        self._params = None
+        self._hover_text = None
 
         if self.gui.is_engine:
             self.is_object = False
@@ -42,6 +47,8 @@ class RxGuiNode(QtCore.QObject):
         self.allow_remove = True
         self.allow_add_terminal = False
         self.__initialize_terminals()
+        if not self.gui.loading:
+            self.graphics_item().update_terminals()
 
     def __next_terminal_name(self, name):
         """Return an unused terminal name"""
@@ -53,11 +60,12 @@ class RxGuiNode(QtCore.QObject):
         return name2
 
     def __initialize_terminals(self):
+        params = self.params()
         for terminal_type in set.union(configuration.TERMS_IN, configuration.TERMS_OUT):
             if self.node_type == "render" and terminal_type == "outputs":
                 continue
-            if terminal_type in self.params():
-                for terminal in self.params()[terminal_type]:
+            if terminal_type in params:
+                for terminal in params[terminal_type]:
                     # Filter out terminals step, and set for actions, observations and render nodes
                     if (
                         (self.node_type == "actions" and (terminal_type == "inputs" or terminal == "set"))
@@ -66,21 +74,38 @@ class RxGuiNode(QtCore.QObject):
                     ):
                         continue
                     name = terminal_type + "/" + terminal
-                    self.add_terminal(name=name)
+                    self.add_terminal(name=name, update=False)
                     if self.node_type == "reset_node" and terminal_type == "outputs":
                         name = "feedthroughs/" + terminal
-                        self.add_terminal(name=name)
+                        self.add_terminal(name=name, update=False)
 
     def params(self):
-        return self.spec.to_dict()
+        """The config of the node. It is cached, so call :meth:`invalidate_params` after the spec is modified."""
+        if self._params is None:
+            self._params = self.spec.to_dict()
+        return self._params
+
+    def hover_text(self):
+        """Text with the params of the node, that is shown when hovering. Cached together with the params."""
+        if self._hover_text is None:
+            hidden = configuration.get_hidden_keys("node", self.node_type)
+            self._hover_text = "".join(f"{key}: {value}\n" for key, value in self.params().items() if key not in hidden)
+        return self._hover_text
+
+    def invalidate_params(self):
+        """Invalidate the cached params (and hover text) of the node and its terminals."""
+        self._params = None
+        self._hover_text = None
+        for term in self.terminals.values():
+            term.invalidate_params()
 
     def get_view(self):
         return self.gui.get_view(self.name, depth=["config"])
 
-    def add_terminal(self, name):
+    def add_terminal(self, name, update=True):
         """Add a new terminal to this Node with the given name.
 
-        Causes sigTerminalAdded to be emitted."""
+        Causes sigTerminalAdded to be emitted. If update is False, the terminals are not laid out again."""
         name = self.__next_terminal_name(name)
 
         term = GuiTerminal(self, name)
@@ -91,7 +116,9 @@ class RxGuiNode(QtCore.QObject):
         else:
             self.outputs[name] = term
 
-        self.graphics_item().update_terminals()
+        if update and not self.gui.loading:
+            # While the gui is loading, the terminals are laid out once all terminals are added
+            self.graphics_item().update_terminals()
         self.sigTerminalAdded.emit(self, term)
         return term
 
@@ -174,8 +201,9 @@ class NodeGraphicsItem(GraphicsObject):
         self.label_changed()
 
     def set_color(self):
-        if "color" in self.node.params() and self.node.params()["color"] in configuration.GUI_COLORS:
-            brush_color = np.array(configuration.GUI_COLORS[self.node.params()["color"]])
+        params = self.node.params()
+        if "color" in params and params["color"] in configuration.GUI_COLORS:
+            brush_color = np.array(configuration.GUI_COLORS[params["color"]])
         else:
             brush_color = np.array([200, 200, 200])
 
@@ -215,73 +243,71 @@ class NodeGraphicsItem(GraphicsObject):
         self.update()
 
     def update_terminals(self):
+        # Lay out the terminals in a single pass: first measure all terminals to size the node, then anchor every terminal
+        # once at its final position.
+        name_rect = self.nameItem.boundingRect()
+        inputs = [self.node.inputs[name] for name in sorted(self.node.inputs.keys())]
+        outputs = [self.node.outputs[name] for name in sorted(self.node.outputs.keys())]
+        sizes = {t.name: t.graphics_item().size() for t in inputs + outputs}
+        max_width_inp = max([sizes[t.name].width() for t in inputs], default=0.0)
+        max_width_out = max([sizes[t.name].width() for t in outputs], default=0.0)
+        y_min = name_rect.height() + 5
+        y_inp = y_min + sum(sizes[t.name].height() + 2 for t in inputs)
+        y_out = y_min + sum(sizes[t.name].height() + 2 for t in outputs)
+
+        # The bounds only grow, to fit the name, the terminals and their labels
+        width, height = self.bounds.width(), self.bounds.height()
+        if name_rect.width() > width - 5.0:
+            width = name_rect.width() + 5.0
+        if max(y_inp, y_out) > height - 5:
+            height = max(y_inp, y_out) + 6.0
+        if max_width_inp + max_width_out > width - 10:
+            width = max_width_inp + max_width_out + 11.0
+        if width != self.bounds.width() or height != self.bounds.height():
+            self.prepareGeometryChange()
+            self.bounds = QtCore.QRectF(0, 0, width, height)
+
         # re-center the label
-        if self.nameItem.boundingRect().width() > self.bounds.width() - 5.0:
-            self.bounds = QtCore.QRectF(0, 0, self.nameItem.boundingRect().width() + 5.0, self.bounds.height())
-        bounds = self.boundingRect()
-        self.nameItem.setPos(bounds.width() / 2.0 - self.nameItem.boundingRect().width() / 2.0, 0)
+        self.nameItem.setPos(self.boundingRect().width() / 2.0 - name_rect.width() / 2.0, 0)
 
-        # Update bounds
-        bounds = self.bounds
         self.terminals = {}
-        inp = self.node.inputs
-        y = self.nameItem.boundingRect().height() + 5
-        max_width_inp = 0.0
-        for i in sorted(inp.keys()):
-            t = inp[i]
-            item = t.graphics_item()
-            item.setParentItem(self)
-            br = self.bounds
-            item.set_anchor(0, y)
-            self.terminals[i] = (t, item)
-            y += item.boundingRect().height() + 2
-            if item.boundingRect().width() > max_width_inp:
-                max_width_inp = item.boundingRect().width()
-        y_inp = y
-
-        out = self.node.outputs
-        dy = bounds.height() / (len(out) + 1)
-        y = self.nameItem.boundingRect().height() + 5
-        max_width_out = 0.0
-        for i in sorted(out.keys()):
-            t = out[i]
-            item = t.graphics_item()
-            item.setParentItem(self)
-            item.setZValue(self.initial_z_value)
-            br = self.bounds
-            item.set_anchor(bounds.width(), y)
-            self.terminals[i] = (t, item)
-            y += item.boundingRect().height() + 2
-            if item.boundingRect().width() > max_width_out:
-                max_width_out = item.boundingRect().width()
-        y_max = max(y_inp, y)
-
-        if y_max > bounds.height() - 5:
-            self.bounds = QtCore.QRectF(0, 0, self.bounds.width(), y_max + 6.0)
-
-        if max_width_inp + max_width_out > bounds.width() - 10:
-            self.bounds = QtCore.QRectF(0, 0, max_width_inp + max_width_out + 11.0, self.bounds.height())
-            self.update_terminals()
+        for x, terminals in [(0.0, inputs), (width, outputs)]:
+            y = y_min
+            for t in terminals:
+                item = t.graphics_item()
+                if item.parentItem() is not self:
+                    item.setParentItem(self)
+                if not t.is_input:
+                    item.setZValue(self.initial_z_value)
+                item.set_anchor(x, y)
+                self.terminals[t.name] = (t, item)
+                y += sizes[t.name].height() + 2
         self.update()
 
+    def set_detailed(self, detailed):
+        self.nameItem.setVisible(detailed)
+        for t, item in self.terminals.values():
+            item.set_detailed(detailed)
+
     def boundingRect(self):
         return self.bounds.adjusted(-5, -5, 5, 5)
 
+    def update_z_value(self):
+        # Hovered and selected nodes are raised above the other nodes. Not done while painting, as changing the z value
+        # schedules another update of the scene.
+        z_value = 200 if self.isSelected() or self.hovered else self.initial_z_value
+        if z_value != self.zValue():
+            self.setZValue(z_value)
+
     def paint(self, p, *args):
-        p.setPen(self.pen)
+        if paint_counter is not None:
+            paint_counter[self.node.name] += 1
         if self.isSelected():
             p.setPen(self.selectPen)
             p.setBrush(self.selectBrush)
-            self.setZValue(200)
         else:
             p.setPen(self.pen)
-            if self.hovered:
-                p.setBrush(self.hoverBrush)
-                self.setZValue(200)
-            else:
-                p.setBrush(self.brush)
-                self.setZValue(self.initial_z_value)
-
+            p.setBrush(self.hoverBrush if self.hovered else self.brush)
         p.drawRect(self.bounds)
 
     def mousePressEvent(self, ev):
@@ -305,13 +331,8 @@ class NodeGraphicsItem(GraphicsObject):
         if ev.button() == QtCore.Qt.MouseButton.LeftButton:
             ev.accept()
             # todo: find out which keys to suppress in dialog
-            filter = []
-            widgets_to_hide = configuration.GUI_WIDGETS["node"]["hide"]
-            for key in self.node.params().keys():
-                if key in widgets_to_hide["all"]:
-                    filter.append(key)
-                elif self._node_type in widgets_to_hide and key in widgets_to_hide[self._node_type]:
-                    filter.append(key)
+            hidden = configuration.get_hidden_keys("node", self._node_type)
+            filter = [key for key in self.node.params().keys() if key in hidden]
             param_window = ParamWindow(spec=self.node.spec, parent=self.parent(), filter=filter)
             param_window.exec()
             param_window.close()
@@ -319,29 +340,48 @@ class NodeGraphicsItem(GraphicsObject):
     def mouseDragEvent(self, ev):
         if ev.button() == QtCore.Qt.MouseButton.LeftButton:
             ev.accept()
+            gui = self.node.gui
+            if ev.isStart():
+                gui.dragging = True
             self.setPos(self.pos() + self.mapToParent(ev.pos()) - self.mapToParent(ev.lastPos()))
+            if ev.isFinish():
+                gui.finish_drag()
 
     def hoverEvent(self, ev):
         if not ev.isExit() and ev.acceptClicks(QtCore.Qt.MouseButton.LeftButton):
             ev.acceptDrags(QtCore.Qt.MouseButton.LeftButton)
-            self.hovered = True
+            self.set_hovered(True)
         else:
-            self.hovered = False
-        self.update()
+            self.set_hovered(False)
+
+    def set_hovered(self, hovered):
+        if hovered != self.hovered:
+            self.hovered = hovered
+            self.update_z_value()
+            self.update()
 
     def keyPressEvent(self, ev):
         ev.ignore()
 
     def itemChange(self, change, val):
-        if change == self.GraphicsItemChange.ItemPositionHasChanged:
-            self.node.gui.graph._state["gui_state"][self.node.name]["pos"] = [
-                self.pos().x(),
-                self.pos().y(),
-            ]
-            for k, t in self.terminals.items():
-                t[1].node_moved()
+        if change == self.GraphicsItemChange.ItemSelectedHasChanged:
+            self.update_z_value()
+        elif change == self.GraphicsItemChange.ItemPositionHasChanged:
+            if self.node.gui.dragging:
+                # Coalesced with other moves, see Gui.flush_moves
+                self.node.gui.schedule_move(self)
+            else:
+                self.write_pos()
+                for k, t in self.terminals.items():
+                    t[1].node_moved()
         return GraphicsObject.itemChange(self, change, val)
 
+    def write_pos(self):
+        self.node.gui.graph._state["gui_state"][self.node.name]["pos"] = [
+            self.pos().x(),
+            self.pos().y(),
+        ]
+
     def getMenu(self):
         return self.menu
 
@@ -2,6 +2,8 @@
  Adapted from https://github.com/pyqtgraph/pyqtgraph/blob/master/pyqtgraph/flowchart/Terminal.py
 """
 
+import math
+
 from pyqtgraph.Qt import QtCore, QtGui, QtWidgets
 from pyqtgraph.graphicsItems.GraphicsObject import GraphicsObject
 from pyqtgraph import functions as fn
@@ -38,6 +40,8 @@ class GuiTerminal(object):
 
         # todo: Check if we want to show different parameters if feedthrough (e.g. of the corresponding output)
         self.spec = getattr(getattr(node.gui.graph.get_spec(node.name), self.terminal_type), self.terminal_name)
+        self._params = None
+        self._hover_text = None
 
         self._graphicsItem = TerminalGraphicsItem(self, parent=self.node.graphics_item())
         self.recolor()
@@ -54,7 +58,22 @@ class GuiTerminal(object):
         self.node.connected(self, term)
 
     def params(self):
-        return self.spec.to_dict()
+        """The params of the terminal. They are cached, so call :meth:`invalidate_params` after the spec is modified."""
+        if self._params is None:
+            self._params = self.spec.to_dict()
+        return self._params
+
+    def hover_text(self):
+        """Text with the name and params of the terminal, that is shown when hovering. Cached together with the params."""
+        if self._hover_text is None:
+            hidden = configuration.get_hidden_keys("term", self.node_type, self.terminal_type)
+            params = "".join(f"\n{key}: {value}" for key, value in self.params().items() if key not in hidden)
+            self._hover_text = "name: " + self.terminal_name + params
+        return self._hover_text
+
+    def invalidate_params(self):
+        self._params = None
+        self._hover_text = None
 
     def is_connected(self):
         return len(self.connections) > 0
@@ -121,6 +140,22 @@ class TextItem(QtWidgets.QGraphicsTextItem):
         super().keyPressEvent(ev)
 
 
+# Sizes of the labels of terminals, per text
+_label_sizes = {}
+
+# Pens of connections, per color and width
+_pens = {}
+
+
+def get_pen(color, width):
+    """Return the (shared) pen with a color and width. The pen must not be modified."""
+    key = (tuple(color), width)
+    pen = _pens.get(key, None)
+    if pen is None:
+        pen = _pens[key] = fn.mkPen(color, width=width)
+    return pen
+
+
 class TerminalGraphicsItem(GraphicsObject):
     def __init__(self, term, parent=None):
         self.term = term
@@ -157,20 +192,42 @@ class TerminalGraphicsItem(GraphicsObject):
     def paint(self, p, *args):
         pass
 
-    def set_anchor(self, x, y):
-        pos = QtCore.QPointF(x, y)
-        self.anchorPos = pos
-        br = self.box.mapRectToParent(self.box.boundingRect())
-        lr = self.label.mapRectToParent(self.label.boundingRect())
-
+    def label_size(self):
+        """Size of the (scaled) label. Sizes are cached per text, as all labels use the same font."""
+        text = self.label.toPlainText()
+        size = _label_sizes.get(text, None)
+        if size is None:
+            size = _label_sizes[text] = self.label.boundingRect().size()
+        return size * self.label.scale()
+
+    def size(self):
+        """Size of the box and the label, as they are positioned by :meth:`set_anchor`."""
+        box_pos, label_pos = self._get_layout(0.0, 0.0)
+        return (self.box.boundingRect().translated(box_pos) | QtCore.QRectF(label_pos, self.label_size())).size()
+
+    def _get_layout(self, x, y):
+        # Positions of the box and the label, for an anchor at (x, y)
+        br = self.box.boundingRect()
+        label_size = self.label_size()
         if self.term.is_input:
-            self.box.setPos(pos.x(), pos.y() - br.height() / 2.0)
-            self.label.setPos(pos.x() + br.width(), pos.y() - lr.height() / 2.0)
+            box_pos = QtCore.QPointF(x, y - br.height() / 2.0)
+            label_pos = QtCore.QPointF(x + br.width(), y - label_size.height() / 2.0)
         else:
-            self.box.setPos(pos.x() - br.width(), pos.y() - br.height() / 2.0)
-            self.label.setPos(pos.x() - br.width() - lr.width(), pos.y() - lr.height() / 2.0)
+            box_pos = QtCore.QPointF(x - br.width(), y - br.height() / 2.0)
+            label_pos = QtCore.QPointF(x - br.width() - label_size.width(), y - label_size.height() / 2.0)
+        return box_pos, label_pos
+
+    def set_anchor(self, x, y):
+        self.anchorPos = QtCore.QPointF(x, y)
+        box_pos, label_pos = self._get_layout(x, y)
+        self.box.setPos(box_pos)
+        self.label.setPos(label_pos)
         self.update_connections()
 
+    def set_detailed(self, detailed):
+        self.box.setVisible(detailed)
+        self.label.setVisible(detailed)
+
     def update_connections(self):
         for t, c in self.term.connections.items():
             c.update_line()
@@ -190,14 +247,8 @@ class TerminalGraphicsItem(GraphicsObject):
         if ev.button() == QtCore.Qt.MouseButton.LeftButton:
             ev.accept()
             # todo: find out which keys to suppress in dialog
-            filter = []
-            terminal_type = self.term.terminal_type
-            widgets_to_hide = configuration.GUI_WIDGETS["term"]["hide"]
-            for key in self.term.params().keys():
-                if key in widgets_to_hide["all"]:
-                    filter.append(key)
-                elif terminal_type in widgets_to_hide and key in widgets_to_hide[terminal_type]:
-                    filter.append(key)
+            hidden = configuration.get_hidden_keys("term", self.term.terminal_type)
+            filter = [key for key in self.term.params().keys() if key in hidden]
             param_window = ParamWindow(spec=self.term.spec, parent=self.parent(), filter=filter)
             param_window.exec()
             param_window.close()
@@ -237,8 +288,12 @@ class ConnectionItem(GraphicsObject):
         self.length = 0
         self.hovered = False
         self.path = None
-        self.shapePath = None
         self.connection_window = None
+        self.detailed = True
+        self.batch = None
+        self._shapes = {}
+        self._zoom_bucket = None
+        self.cull_rect = None
 
         if self.source.term.is_state:
             self.style = {
@@ -260,19 +315,37 @@ class ConnectionItem(GraphicsObject):
                 "selectedColor": (200, 200, 0, 255),
                 "selectedWidth": 4.0,
             }
-        self.source.getViewBox().addItem(self)
         self.update_line()
 
+    def set_detailed(self, detailed):
+        """Draw the connection as a straight line if not detailed, regardless of its style."""
+        if detailed != self.detailed:
+            self.detailed = detailed
+            self.update_line()
+
     def set_target(self, target):
         self.target = target
         self.update_line()
 
+    def set_cull_rect(self, rect):
+        """Hide the connection while it is outside of rect (in the coordinates of its parent), or never hide it if None."""
+        self.cull_rect = rect
+        # The bounds are padded, because those of horizontal or vertical lines are empty
+        visible = rect is None or self.path is None
+        visible = visible or rect.intersects(self.mapRectToParent(self.path.boundingRect()).adjusted(-1, -1, 1, 1))
+        if visible != self.isVisible():
+            self.setVisible(visible)
+            if self.batch is not None:
+                self.batch.invalidate()
+
     def setStyle(self, **kwds):
         self.style.update(kwds)
         if "shape" in kwds:
             self.update_line()
         else:
             self.update()
+            if self.batch is not None:
+                self.batch.invalidate()
 
     def update_line(self):
         start = Point(self.source.connect_point())
@@ -294,14 +367,18 @@ class ConnectionItem(GraphicsObject):
         self.prepareGeometryChange()
 
         self.path = self.generate_path(start, stop)
-        self.shapePath = None
+        self._shapes = {}
         self.update()
         self.setZValue(-1)
+        if self.cull_rect is not None:
+            self.set_cull_rect(self.cull_rect)
+        if self.batch is not None:
+            self.batch.invalidate()
 
     def generate_path(self, start, stop):
         path = QtGui.QPainterPath()
         path.moveTo(start)
-        if self.style["shape"] == "line":
+        if self.style["shape"] == "line" or not self.detailed:
             path.lineTo(stop)
         elif self.style["shape"] == "cubic":
             path.cubicTo(
@@ -352,36 +429,106 @@ class ConnectionItem(GraphicsObject):
                 self.connection_window.show()
 
     def hoverEvent(self, ev):
+        hovered = self.hovered
         if (not ev.isExit()) and ev.acceptClicks(QtCore.Qt.MouseButton.LeftButton):
             self.hovered = True
         else:
             self.hovered = False
         self.update()
+        if self.batch is not None and hovered != self.hovered:
+            self.batch.invalidate()
+
+    def itemChange(self, change, val):
+        if change == self.GraphicsItemChange.ItemSelectedHasChanged and self.batch is not None:
+            self.batch.invalidate()
+        return GraphicsObject.itemChange(self, change, val)
 
     def boundingRect(self):
         return self.shape().boundingRect()
 
-    def viewRangeChanged(self):
-        self.shapePath = None
-        self.prepareGeometryChange()
+    def get_zoom_bucket(self):
+        # The pixel width, rounded to a quarter octave. Shapes are only stroked again after zooming to another bucket.
+        px = self.pixelWidth()
+        return None if px <= 0 else round(4 * math.log2(px))
+
+    def viewTransformChanged(self):
+        GraphicsObject.viewTransformChanged(self)
+        # Panning does not change the shape, so the geometry only changes with the zoom bucket
+        bucket = self.get_zoom_bucket()
+        if bucket != self._zoom_bucket:
+            self.prepareGeometryChange()
+            self._zoom_bucket = bucket
 
     def shape(self):
-        if self.shapePath is None:
-            if self.path is None:
-                return QtGui.QPainterPath()
+        if self.path is None:
+            return QtGui.QPainterPath()
+        if self._zoom_bucket is None:
+            self._zoom_bucket = self.get_zoom_bucket()
+        shape = self._shapes.get(self._zoom_bucket, None)
+        if shape is None:
             stroker = QtGui.QPainterPathStroker()
-            px = self.pixelWidth()
+            px = 0 if self._zoom_bucket is None else 2 ** (self._zoom_bucket / 4)
             stroker.setWidth(px * 8)
-            self.shapePath = stroker.createStroke(self.path)
-        return self.shapePath
+            shape = self._shapes[self._zoom_bucket] = stroker.createStroke(self.path)
+        return shape
 
     def paint(self, p, *args):
         if self.isSelected():
-            p.setPen(fn.mkPen(self.style["selectedColor"], width=self.style["selectedWidth"]))
+            p.setPen(get_pen(self.style["selectedColor"], self.style["selectedWidth"]))
+        elif self.hovered:
+            p.setPen(get_pen(self.style["hoverColor"], self.style["hoverWidth"]))
+        elif self.batch is not None:
+            return  # Drawn by the batch
         else:
-            if self.hovered:
-                p.setPen(fn.mkPen(self.style["hoverColor"], width=self.style["hoverWidth"]))
-            else:
-                p.setPen(fn.mkPen(self.style["color"], width=self.style["width"]))
-
+            p.setPen(get_pen(self.style["color"], self.style["width"]))
         p.drawPath(self.path)
+
+
+class ConnectionBatch(GraphicsObject):
+    """
+    Draws all connections that are neither selected nor hovered, with a single combined path per pen.
+
+    The connections themselves are only drawn by their :class:`ConnectionItem` while they are selected or hovered, and are
+    still used to select and hover them.
+    """
+
+    def __init__(self):
+        GraphicsObject.__init__(self)
+        self.connections = []
+        self._paths = None
+        self._bounds = QtCore.QRectF()
+
+    def add(self, connection):
+        connection.batch = self
+        self.connections.append(connection)
+        self.invalidate()
+
+    def invalidate(self):
+        """Combine the paths again before the next paint, e.g. after a connection moved or was selected."""
+        self._paths = None
+        self.prepareGeometryChange()
+        self.update()
+
+    def get_paths(self):
+        if self._paths is None:
+            self._paths = {}
+            for connection in self.connections:
+                if connection.path is None or connection.isSelected() or connection.hovered or not connection.isVisible():
+                    continue
+                key = (tuple(connection.style["color"]), connection.style["width"])
+                if key not in self._paths:
+                    self._paths[key] = QtGui.QPainterPath()
+                self._paths[key].addPath(connection.path)
+            self._bounds = QtCore.QRectF()
+            for (_, width), path in self._paths.items():
+                self._bounds |= path.boundingRect().adjusted(-width, -width, width, width)
+        return self._paths
+
+    def boundingRect(self):
+        self.get_paths()
+        return self._bounds
+
+    def paint(self, p, *args):
+        for (color, width), path in self.get_paths().items():
+            p.setPen(get_pen(color, width))
+            p.drawPath(path)
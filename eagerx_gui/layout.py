@@ -0,0 +1,408 @@
+from collections import deque
+
+import numpy as np
+
+
+def get_components(nodes, adjacency):
+    # Weakly connected components, ordered by the first node of each component in nodes
+    node_set = set(nodes)
+    components = []
+    visited = set()
+    for node in nodes:
+        if node in visited:
+            continue
+        component = []
+        visited.add(node)
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            component.append(current)
+            for connected_node in {**adjacency[current]["inputs"], **adjacency[current]["outputs"]}:
+                if connected_node in node_set and connected_node not in visited:
+                    visited.add(connected_node)
+                    stack.append(connected_node)
+        components.append(component)
+    return components
+
+
+def layered_layout(nodes, adjacency, left_nodes, right_nodes, node_size=150, sweeps=4):
+    """
+    Positions nodes in layers from left to right, as in the layered graph drawing method of Sugiyama et al.
+
+    Nodes are ranked by their longest distance from the left nodes, such that every connection points to the right, while the
+    right nodes are put in the last layer. The order of the nodes within each layer is determined with the barycenter
+    heuristic to reduce the number of crossing connections. Components without left or right nodes are laid out below each
+    other. The result only depends on the order of the nodes and connections, i.e. it is deterministic.
+
+    :param nodes: The names of the nodes to position.
+    :param adjacency: The in- and outgoing neighbours of each node, see :func:`eagerx_gui.utils.get_adjacency`.
+    :param left_nodes: Nodes that are placed in the first layer.
+    :param right_nodes: Nodes that are placed in the last layer.
+    :param node_size: Distance between nodes in the same layer.
+    :param sweeps: Number of down and up sweeps of the barycenter heuristic.
+    :return: Dict with the position of each node.
+    """
+    fixed_nodes = set.union(set(left_nodes), set(right_nodes))
+    main_band = []
+    bands = [main_band]
+    for component in get_components(nodes, adjacency):
+        if fixed_nodes.intersection(component):
+            main_band.extend(component)
+        else:
+            bands.append(component)
+
+    order = {node: i for i, node in enumerate(nodes)}
+    layer_spacing = 2 * node_size
+    main_width = None
+    positions = {}
+    y_bottom = None
+    for band in bands:
+        if len(band) == 0:
+            continue
+        band = sorted(band, key=lambda node: order[node])
+        ranks, edges = _assign_ranks(band, adjacency, left_nodes, right_nodes)
+        layers = _order_layers(band, ranks, edges, sweeps)
+        layers = [[node for node in layer if not isinstance(node, _Dummy)] for layer in layers]
+        width = (len(layers) - 1) * layer_spacing
+        height = (max(len(layer) for layer in layers) - 1) * node_size
+        if main_width is None:
+            main_width = width
+        x_offset = (main_width - width) / 2
+        y_center = 0 if y_bottom is None else y_bottom + 2 * node_size + height / 2
+        for rank, layer in enumerate(layers):
+            for i, node in enumerate(layer):
+                x = x_offset + rank * layer_spacing
+                y = y_center + (i - (len(layer) - 1) / 2) * node_size
+                positions[node] = [x, y]
+        y_bottom = y_center + height / 2
+    return positions
+
+
+def incremental_layout(nodes, adjacency, positions, node_size=150):
+    """
+    Positions the nodes that do not have a position yet, without moving the nodes that do.
+
+    Each new node is placed to the right of the nodes connected to its inputs and to the left of the nodes connected to its
+    outputs, as soon as one of them has been positioned. New nodes without any positioned neighbour are placed below all
+    other nodes. A node is moved down if its location is already occupied by another node.
+
+    :param nodes: The names of all nodes.
+    :param adjacency: The in- and outgoing neighbours of each node, see :func:`eagerx_gui.utils.get_adjacency`.
+    :param positions: Dict with the positions of the nodes that have already been positioned.
+    :param node_size: Minimal distance between nodes.
+    :return: Dict with the position of each new node.
+    """
+    layer_spacing = 2 * node_size
+    new_positions = {}
+    queue = deque(node for node in nodes if node not in positions)
+    if len(queue) == 0:
+        return new_positions
+    occupied = {_get_cell(pos, node_size) for pos in positions.values()}
+    bottom_left = None
+    deferred = 0
+    while queue:
+        node = queue.popleft()
+        anchors = []
+        for source in adjacency[node]["inputs"]:
+            pos = new_positions.get(source, positions.get(source, None))
+            if pos is not None:
+                anchors.append([pos[0] + layer_spacing, pos[1]])
+        for target in adjacency[node]["outputs"]:
+            pos = new_positions.get(target, positions.get(target, None))
+            if pos is not None and target != node:
+                anchors.append([pos[0] - layer_spacing, pos[1]])
+        if len(anchors) > 0:
+            pos = [sum(anchor[0] for anchor in anchors) / len(anchors), sum(anchor[1] for anchor in anchors) / len(anchors)]
+        elif deferred <= len(queue):
+            # Wait until one of the neighbours has been positioned
+            queue.append(node)
+            deferred += 1
+            continue
+        else:
+            if bottom_left is None:
+                placed = list(positions.values()) + list(new_positions.values())
+                x = min([pos[0] for pos in placed] + [0])
+                y = max([pos[1] for pos in placed] + [-2 * node_size])
+                bottom_left = [x, y + 2 * node_size]
+            pos = list(bottom_left)
+        cell = _get_cell(pos, node_size)
+        while cell in occupied:
+            pos[1] += node_size
+            cell = _get_cell(pos, node_size)
+        occupied.add(cell)
+        new_positions[node] = pos
+        deferred = 0
+    return new_positions
+
+
+def force_layout(pos, edges, k=1.0, clusters=None, pinned=None, iterations=50, threshold=1e-4, method="auto"):
+    """
+    Fruchterman-Reingold force-directed layout of one or more clusters of nodes at once, vectorized with NumPy.
+
+    Nodes only repel the other nodes in their cluster, so independent clusters are laid out in a single computation.
+    As in :func:`networkx.spring_layout`, the step size of each cluster starts at a tenth of the size of its initial
+    layout and decreases linearly. A cluster stops moving once the norm of its displacement, divided by its number of
+    nodes, drops below threshold.
+
+    :param pos: Array with the initial (x, y) position of each node.
+    :param edges: Array with the indices of connected nodes, one (source, target) pair per row.
+    :param k: Optimal distance between nodes, either a scalar or an array with a value per node.
+              Must be equal for all nodes in a cluster.
+    :param clusters: Array with the cluster index of each node. If None, all nodes are in a single cluster.
+    :param pinned: Boolean array that is True for the nodes that must not be moved.
+    :param iterations: Maximum number of iterations.
+    :param threshold: Threshold for the displacement at which a cluster is considered to have converged.
+    :param method: How the repulsive forces are computed. With "exact", all pairs of nodes in a cluster repel each other.
+                   With "grid", only nodes within a distance of 2k repel each other, which are found with a grid of
+                   cells that is rebuilt each iteration (Fruchterman and Reingold, 1991). With "auto", "grid" is used for
+                   more than 500 nodes.
+    :return: Array with the position of each node.
+    """
+    pos = np.array(pos, dtype=float).reshape(-1, 2)
+    num_nodes = len(pos)
+    if num_nodes == 0:
+        return pos
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    k = np.broadcast_to(np.asarray(k, dtype=float), (num_nodes,))
+    clusters = np.zeros(num_nodes, dtype=np.int64) if clusters is None else np.unique(clusters, return_inverse=True)[1]
+    clusters = clusters.reshape(-1)
+    num_clusters = clusters.max() + 1
+    movable = np.ones(num_nodes, dtype=bool) if pinned is None else ~np.asarray(pinned, dtype=bool)
+    if method == "auto":
+        method = "grid" if num_nodes > 500 else "exact"
+    assert method in ["exact", "grid"], f"Invalid method '{method}'. Should be 'exact', 'grid' or 'auto'."
+
+    # Scale each cluster such that its optimal distance is 1, which does not change the direction of the forces
+    original = pos
+    pos = pos / k[:, None]
+    cluster_k = np.zeros(num_clusters)
+    cluster_k[clusters] = k
+    cluster_size = np.bincount(clusters, minlength=num_clusters)
+
+    # Initial step size of each cluster is a tenth of its size
+    upper = np.full((num_clusters, 2), -np.inf)
+    lower = np.full((num_clusters, 2), np.inf)
+    np.maximum.at(upper, clusters, pos)
+    np.minimum.at(lower, clusters, pos)
+    temperature = 0.1 * np.max(upper - lower, axis=1)
+    cooling = temperature / (iterations + 1)
+    active = np.ones(num_clusters, dtype=bool)
+
+    # Undirected edges, such that each connection attracts both nodes
+    edges = np.concatenate([edges, edges[:, ::-1]])
+    # Distances and displacements are bounded as in networkx, i.e. in the original scale
+    min_distance2 = (0.01 / k) ** 2
+    min_length = 0.01 / k
+    same_cluster = None
+    if method == "exact" and num_clusters > 1:
+        same_cluster = np.equal.outer(clusters, clusters)
+    for _ in range(iterations):
+        if method == "exact":
+            # Squared distances of all pairs, using |a - b|^2 = |a|^2 + |b|^2 - 2 a.b
+            squared = np.einsum("ij,ij->i", pos, pos)
+            repulsion = pos @ pos.T
+            repulsion *= -2.0
+            repulsion += squared[:, None]
+            repulsion += squared[None, :]
+            np.clip(repulsion, min_distance2[:, None], None, out=repulsion)
+            np.reciprocal(repulsion, out=repulsion)
+            if same_cluster is not None:
+                repulsion *= same_cluster
+            np.fill_diagonal(repulsion, 0.0)
+            displacement = pos * repulsion.sum(axis=1)[:, None] - repulsion @ pos
+        else:
+            i, j = _get_grid_pairs(pos, clusters, cell_size=2.0)
+            dx = pos[i, 0] - pos[j, 0]
+            dy = pos[i, 1] - pos[j, 1]
+            distance2 = dx * dx + dy * dy
+            np.clip(distance2, min_distance2[i], None, out=distance2)
+            repulsion = (distance2 < 4.0) / distance2
+            dx *= repulsion
+            dy *= repulsion
+            displacement = np.empty_like(pos)
+            displacement[:, 0] = np.bincount(i, weights=dx, minlength=num_nodes) - np.bincount(
+                j, weights=dx, minlength=num_nodes
+            )
+            displacement[:, 1] = np.bincount(i, weights=dy, minlength=num_nodes) - np.bincount(
+                j, weights=dy, minlength=num_nodes
+            )
+        if len(edges) > 0:
+            i, j = edges[:, 0], edges[:, 1]
+            delta = pos[i] - pos[j]
+            attraction = -np.sqrt(np.einsum("ij,ij->i", delta, delta))
+            displacement[:, 0] += np.bincount(i, weights=delta[:, 0] * attraction, minlength=num_nodes)
+            displacement[:, 1] += np.bincount(i, weights=delta[:, 1] * attraction, minlength=num_nodes)
+
+        # Limit the displacement of each node to the step size of its cluster
+        length = np.sqrt(np.einsum("ij,ij->i", displacement, displacement))
+        length = np.where(length < min_length, 10 * min_length, length)
+        delta_pos = displacement * (temperature[clusters] / length)[:, None]
+        delta_pos[~(movable & active[clusters])] = 0.0
+        pos += delta_pos
+        temperature -= cooling
+
+        # Stop moving clusters that have converged
+        cluster_norm = np.sqrt(
+            np.bincount(clusters, weights=np.einsum("ij,ij->i", delta_pos, delta_pos), minlength=num_clusters)
+        )
+        active &= cluster_norm * cluster_k / cluster_size >= threshold
+        if not np.any(active):
+            break
+    pos *= k[:, None]
+    # Pinned nodes are returned exactly, without the rounding errors of scaling them
+    pos[~movable] = original[~movable]
+    return pos
+
+
+def _get_grid_pairs(pos, clusters, cell_size):
+    # All unique pairs of nodes in the same cluster that are in the same or in adjacent cells of a grid
+    cells = np.floor(pos / cell_size).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    width, height = cells.max(axis=0) + 2
+    keys = (clusters * width + cells[:, 0]) * height + cells[:, 1]
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    pairs_i = []
+    pairs_j = []
+    # Only half of the adjacent cells are visited, such that every pair of cells is considered once
+    for dx, dy in [(0, 0), (0, 1), (1, -1), (1, 0), (1, 1)]:
+        neighbour_keys = sorted_keys + dx * height + dy
+        start = np.searchsorted(sorted_keys, neighbour_keys, side="left")
+        count = np.searchsorted(sorted_keys, neighbour_keys, side="right") - start
+        if dx == 0 and dy == 0:
+            # Within a cell, pair each node with the nodes that come after it
+            count = count - (np.arange(len(pos)) - start) - 1
+            start = np.arange(len(pos)) + 1
+        i = np.repeat(order, count)
+        offset = np.arange(len(i)) - np.repeat(np.cumsum(count) - count, count)
+        j = order[np.repeat(start, count) + offset]
+        pairs_i.append(i)
+        pairs_j.append(j)
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+def rescale_layout(pos, scale=1.0):
+    # Center positions and scale them such that the largest absolute coordinate equals scale
+    pos = pos - pos.mean(axis=0)
+    limit = np.abs(pos).max() if len(pos) > 0 else 0
+    if limit > 0:
+        pos = pos * scale / limit
+    return pos
+
+
+def _get_cell(pos, node_size):
+    return round(pos[0] / node_size), round(pos[1] / node_size)
+
+
+class _Dummy(object):
+    # Placeholder in the intermediate layers of a connection that spans multiple layers
+    def __init__(self, source, target, rank):
+        self.source = source
+        self.target = target
+        self.rank = rank
+
+    def __repr__(self):
+        return "<Dummy %s->%s @%d>" % (self.source, self.target, self.rank)
+
+
+def _assign_ranks(nodes, adjacency, left_nodes, right_nodes):
+    # Remove cycles by dropping the back edges of a depth-first search that starts at the left nodes.
+    # Connections into left nodes or out of right nodes are dropped as well, as they would point to the left.
+    node_set = set(nodes)
+    edges = {node: [] for node in nodes}
+    state = {}
+    roots = [node for node in nodes if node in left_nodes] + [node for node in nodes if node not in left_nodes]
+    for root in roots:
+        if root in state:
+            continue
+        state[root] = "active"
+        stack = [(root, iter(adjacency[root]["outputs"]))]
+        while stack:
+            node, successors = stack[-1]
+            for successor in successors:
+                if successor not in node_set or successor == node:
+                    continue
+                if successor in left_nodes or node in right_nodes or state.get(successor) == "active":
+                    continue
+                edges[node].append(successor)
+                if successor not in state:
+                    state[successor] = "active"
+                    stack.append((successor, iter(adjacency[successor]["outputs"])))
+                    break
+            else:
+                state[node] = "done"
+                stack.pop()
+
+    # Topological order of the remaining (acyclic) edges
+    in_degree = {node: 0 for node in nodes}
+    for node in nodes:
+        for successor in edges[node]:
+            in_degree[successor] += 1
+    topological = [node for node in nodes if in_degree[node] == 0]
+    for node in topological:
+        for successor in edges[node]:
+            in_degree[successor] -= 1
+            if in_degree[successor] == 0:
+                topological.append(successor)
+
+    # Longest path layering, where nodes without inputs are pulled towards the layer before their first output
+    ranks = {node: 0 for node in nodes}
+    for node in topological:
+        for successor in edges[node]:
+            ranks[successor] = max(ranks[successor], ranks[node] + 1)
+    last_rank = max([ranks[node] for node in nodes if node not in right_nodes] + [0]) + 1
+    for node in nodes:
+        if node in right_nodes:
+            ranks[node] = last_rank
+    has_input = {successor for node in nodes for successor in edges[node]}
+    for node in reversed(topological):
+        if node in has_input or node in left_nodes or node in right_nodes or len(edges[node]) == 0:
+            continue
+        ranks[node] = max(0, min(ranks[successor] for successor in edges[node]) - 1)
+    return ranks, edges
+
+
+def _order_layers(nodes, ranks, edges, sweeps):
+    # Split connections that span multiple layers with dummies, such that all connections are between adjacent layers
+    num_layers = max(ranks.values()) + 1
+    layers = [[] for _ in range(num_layers)]
+    for node in nodes:
+        layers[ranks[node]].append(node)
+    successors = {node: [] for node in nodes}
+    predecessors = {node: [] for node in nodes}
+    for node in nodes:
+        for target in edges[node]:
+            source = node
+            for rank in range(ranks[node] + 1, ranks[target]):
+                dummy = _Dummy(node, target, rank)
+                layers[rank].append(dummy)
+                successors[dummy] = []
+                predecessors[dummy] = []
+                successors[source].append(dummy)
+                predecessors[dummy].append(source)
+                source = dummy
+            successors[source].append(target)
+            predecessors[target].append(source)
+
+    # Barycenter heuristic, alternating between sweeps down (towards the right) and up (towards the left)
+    for _ in range(sweeps):
+        for rank in range(1, num_layers):
+            layers[rank] = _sort_by_barycenter(layers[rank], layers[rank - 1], predecessors)
+        for rank in range(num_layers - 2, -1, -1):
+            layers[rank] = _sort_by_barycenter(layers[rank], layers[rank + 1], successors)
+    return layers
+
+
+def _sort_by_barycenter(layer, fixed_layer, neighbours):
+    index = {node: i for i, node in enumerate(fixed_layer)}
+    barycenters = []
+    for i, node in enumerate(layer):
+        positions = [index[neighbour] for neighbour in neighbours[node]]
+        if len(positions) > 0:
+            barycenters.append(sum(positions) / len(positions))
+        else:
+            # Scale the current position to the fixed layer, such that unconnected nodes keep their relative position
+            barycenters.append(i * max(len(fixed_layer) - 1, 0) / max(len(layer) - 1, 1))
+    order = sorted(range(len(layer)), key=lambda i: barycenters[i])
+    return [layer[i] for i in order]
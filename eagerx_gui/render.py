@@ -0,0 +1,438 @@
+import os
+import struct
+import sys
+import zlib
+
+import numpy as np
+import pyqtgraph as pg
+import pyqtgraph.exporters
+from pyqtgraph import functions as fn
+from pyqtgraph.exporters.SVGExporter import generateSvg
+from pyqtgraph.Qt import QtCore, QtGui, QtWidgets
+
+from eagerx_gui.cache import get_render_cache, get_render_key
+from eagerx_gui.gui import Gui
+from eagerx_gui.utils import add_pos_to_state
+
+
+def get_application(platform="offscreen"):
+    """
+    Return the running QApplication, or create one.
+
+    :param platform: Qt platform plugin of a newly created application, e.g. "offscreen" to render without a display.
+                     If None, the platform is selected by Qt (e.g. with the environment variable QT_QPA_PLATFORM).
+    """
+    app = QtWidgets.QApplication.instance()
+    if app is None:
+        argv = ["eagerx_gui"] if platform is None else ["eagerx_gui", "-platform", platform]
+        app = QtWidgets.QApplication(argv)
+    return app
+
+
+def check_resolution(resolution):
+    if resolution is None:
+        return [1920, 1080]
+    assert (
+        type(resolution) is list or type(resolution) is np.ndarray
+    ), f"Invalid type for argument resolution. Should be list or ndarray, but is {type(resolution)}."
+    assert len(resolution) == 2, f"Invalid length argument resolution. Should be 2, but is {len(resolution)}."
+    return [int(resolution[0]), int(resolution[1])]
+
+
+def _create_image(resolution, rgb=False, out=None):
+    # The array owns the memory and the QImage only wraps it, so the array remains valid after the QImage is deleted.
+    width, height = resolution
+    channels = 3 if rgb else 4
+    if out is None:
+        out = np.empty((height, width, channels), dtype=np.uint8)
+    else:
+        assert out.dtype == np.uint8, f"Invalid dtype of argument out. Should be uint8, but is {out.dtype}."
+        assert out.shape == (height, width, channels), f"Invalid shape of argument out. Should be {(height, width, channels)}."
+        assert (
+            out.strides[1:] == (channels, 1) and out.strides[0] >= width * channels
+        ), "Invalid strides of argument out. Pixels within a row must be contiguous."
+    # Rows can be strided, e.g. for tiles of a larger image, so the QImage is created with the address of the first pixel
+    image_format = QtGui.QImage.Format.Format_RGB888 if rgb else QtGui.QImage.Format.Format_RGBA8888
+    image = QtGui.QImage(out.ctypes.data, width, height, out.strides[0], image_format)
+    image.data = out  # Keep the array alive as long as the image
+    return out, image
+
+
+def export_image(scene, resolution, rgb=False, out=None):
+    """
+    Render the view of a scene directly into a NumPy array, without intermediate images or copies.
+
+    :param scene: The scene to render, e.g. the scene of a Gui.
+    :param resolution: Resolution [width, height] of the image.
+    :param rgb: Render to an RGB instead of an RGBA image.
+    :param out: uint8 array with shape (height, width, 3 if rgb else 4) to render into, e.g. to reuse it for many renders.
+                Pixels within a row must be contiguous.
+    :return: The array with the rendered image.
+    """
+    width, height = resolution
+    out, image = _create_image(resolution, rgb=rgb, out=out)
+
+    # Same as pg.exporters.ImageExporter.export, but painting on the provided image.
+    exporter = pg.exporters.ImageExporter(scene)
+    exporter.parameters()["width"] = width
+    exporter.parameters()["height"] = height
+    image.fill(exporter.parameters()["background"])
+    painter = QtGui.QPainter(image)
+    try:
+        exporter.setExportMode(
+            True,
+            {
+                "antialias": exporter.parameters()["antialias"],
+                "background": exporter.parameters()["background"],
+                "painter": painter,
+                "resolutionScale": width / exporter.getTargetRect().width(),
+            },
+        )
+        painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing, exporter.parameters()["antialias"])
+        scene.render(painter, QtCore.QRectF(0, 0, width, height), QtCore.QRectF(exporter.getSourceRect()))
+    finally:
+        exporter.setExportMode(False)
+        painter.end()
+    return out
+
+
+def render_scene(scene, source, resolution, rgb=False, out=None, background=(255, 255, 255)):
+    """
+    Render part of a scene directly into a NumPy array. Unlike :func:`export_image`, the scene does not need a view.
+
+    :param scene: The scene to render, e.g. the scene of a headless Gui.
+    :param source: Rectangle in scene coordinates that is rendered, e.g. the scene bounding rectangle of the view box.
+    :param resolution: Resolution [width, height] of the image.
+    :param rgb: Render to an RGB instead of an RGBA image.
+    :param out: Preallocated array to render into, see :func:`export_image`.
+    :param background: Color that the image is filled with before rendering.
+    :return: The array with the rendered image.
+    """
+    width, height = resolution
+    out, image = _create_image(resolution, rgb=rgb, out=out)
+    image.fill(fn.mkColor(background))
+    painter = QtGui.QPainter(image)
+    try:
+        painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing, True)
+        scene.render(painter, QtCore.QRectF(0, 0, width, height), QtCore.QRectF(source))
+    finally:
+        painter.end()
+    return out
+
+
+def render_tiled(scene, source, resolution, tile_size=1024, rgb=False, out=None, background=(255, 255, 255)):
+    """
+    Render part of a scene tile by tile, directly into (slices of) an array.
+
+    Apart from the output array, only the painter of a single tile is allocated. To keep memory bounded for very large
+    resolutions, pass a memory-mapped array as out (e.g. created with :func:`numpy.lib.format.open_memmap`), or write a
+    png with :func:`render_png`.
+
+    :param scene: The scene to render.
+    :param source: Rectangle in scene coordinates that is rendered.
+    :param resolution: Resolution [width, height] of the image.
+    :param tile_size: Width and height of the tiles in pixels.
+    :param rgb: Render to an RGB instead of an RGBA image.
+    :param out: Preallocated array to render into, see :func:`export_image`.
+    :param background: Color that the image is filled with before rendering.
+    :return: The array with the rendered image.
+    """
+    width, height = resolution
+    out, _ = _create_image(resolution, rgb=rgb, out=out)
+    source = QtCore.QRectF(source)
+    for y in range(0, height, tile_size):
+        _render_band(scene, source, resolution, y, tile_size, out[y : y + tile_size], rgb, background)
+    return out
+
+
+def render_png(scene, source, resolution, filename, tile_size=1024, rgb=False, background=(255, 255, 255), level=6):
+    """
+    Render part of a scene to a png file, band by band, such that memory is bounded by tile_size rows of the image.
+
+    :param scene: The scene to render.
+    :param source: Rectangle in scene coordinates that is rendered.
+    :param resolution: Resolution [width, height] of the image.
+    :param filename: Path of the png file.
+    :param tile_size: Width and height of the tiles in pixels.
+    :param rgb: Write an RGB instead of an RGBA image.
+    :param background: Color that the image is filled with before rendering.
+    :param level: Compression level of zlib.
+    """
+    width, height = resolution
+    channels = 3 if rgb else 4
+    source = QtCore.QRectF(source)
+    band = np.empty((min(tile_size, height), width, channels), dtype=np.uint8)
+    rows = np.empty((min(tile_size, height), 1 + width * channels), dtype=np.uint8)
+    rows[:, 0] = 1  # Sub filter, i.e. the difference with the previous pixel, which compresses uniform areas well
+    compressor = zlib.compressobj(level)
+    with open(filename, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2 if rgb else 6, 0, 0, 0)))
+        for y in range(0, height, tile_size):
+            band_height = min(tile_size, height - y)
+            _render_band(scene, source, resolution, y, tile_size, band[:band_height], rgb, background)
+            pixels = band[:band_height].reshape(band_height, width * channels)
+            rows[:band_height, 1 : 1 + channels] = pixels[:, :channels]
+            np.subtract(pixels[:, channels:], pixels[:, :-channels], out=rows[:band_height, 1 + channels :])
+            data = compressor.compress(rows[:band_height])
+            if len(data) > 0:
+                f.write(_png_chunk(b"IDAT", data))
+        f.write(_png_chunk(b"IDAT", compressor.flush()))
+        f.write(_png_chunk(b"IEND", b""))
+
+
+def _render_band(scene, source, resolution, y, tile_size, band, rgb, background):
+    # Render the rows starting at y, tile by tile. Each tile paints the corresponding part of source.
+    width, height = resolution
+    scale_x = source.width() / width
+    scale_y = source.height() / height
+    for x in range(0, width, tile_size):
+        tile = band[:, x : x + tile_size]
+        tile_height, tile_width = tile.shape[:2]
+        _, image = _create_image([tile_width, tile_height], rgb=rgb, out=tile)
+        image.fill(fn.mkColor(background))
+        painter = QtGui.QPainter(image)
+        try:
+            painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing, True)
+            tile_source = QtCore.QRectF(
+                source.x() + x * scale_x, source.y() + y * scale_y, tile_width * scale_x, tile_height * scale_y
+            )
+            scene.render(painter, QtCore.QRectF(0, 0, tile_width, tile_height), tile_source)
+        finally:
+            painter.end()
+
+
+def _png_chunk(chunk_type, data):
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF)
+
+
+def render_svg(scene, filename, resolution, background=(255, 255, 255)):
+    """Export a scene without a view to an svg file, in scene coordinates."""
+    options = {"background": fn.mkColor(background), "width": resolution[0], "height": resolution[1], "scaling stroke": False}
+    with open(filename, "wb") as f:
+        f.write(generateSvg(scene, options).encode("utf-8"))
+
+
+class RenderSession(object):
+    """
+    Renders graphs to images without ever showing a window.
+
+    The QApplication and the Gui are created once and reused for every render, which is much faster than
+    :func:`eagerx_gui.render_gui` creating them for every graph.
+
+    :param resolution: Default resolution [width, height] of the rendered images.
+    :param platform: Qt platform plugin used if no QApplication is running yet, see :func:`get_application`.
+    :param headless: Only create the scene with the graph, without the widgets of the Gui, see :func:`render_scene`.
+    """
+
+    def __init__(self, resolution=None, platform="offscreen", headless=True):
+        self.resolution = check_resolution(resolution)
+        self.headless = headless
+        self.app = get_application(platform)
+        self.gui = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def render(
+        self,
+        state,
+        resolution=None,
+        is_engine=False,
+        filename=None,
+        layout="spring",
+        incremental=False,
+        workers=None,
+        rgb=False,
+        out=None,
+        tile_size=None,
+        cache=None,
+    ):
+        """
+        Render a graph to an RGBA image.
+
+        Images are looked up in and stored to the provided :class:`eagerx_gui.cache.RenderCache`, or the cache returned by
+        :func:`eagerx_gui.cache.get_render_cache` if None, which is no cache unless it was set. Caching is disabled with
+        `cache=False`. The returned image is always a new writable array (or out), also if it was cached.
+
+        :param state: State of the (engine) graph.
+        :param resolution: Resolution [width, height] of the image. If None, the default of the session is used.
+        :param is_engine: True if state is the state of an engine graph.
+        :param filename: If provided, the graph is also exported to this svg file.
+        :param layout: Layout of nodes without a position, see :func:`eagerx_gui.utils.add_pos_to_state`.
+        :param incremental: Only position nodes without a position next to their neighbours.
+        :param workers: Number of processes, or an executor, to lay out loose clusters with.
+        :param rgb: Return an RGB instead of an RGBA image.
+        :param out: Preallocated array to render into, see :func:`export_image`.
+        :param tile_size: If provided, the image is rendered in tiles of this size, see :func:`render_tiled`.
+        :param cache: Render cache, None to use the default cache (if set), or False to disable caching.
+        :return: Array with shape (height, width, 4), or (height, width, 3) if rgb is True.
+        """
+        resolution = self.resolution if resolution is None else check_resolution(resolution)
+        if filename is not None and not filename.endswith(".svg"):
+            filename += ".svg"
+
+        # Reuse the image of an identical graph
+        if cache is None:
+            cache = get_render_cache()
+        elif cache is False:
+            cache = None
+        if cache is not None:
+            # Loading the graph adds the positions of the nodes to the state, so they are added before it is hashed
+            add_pos_to_state(state, is_engine=is_engine, layout=layout, incremental=incremental, workers=workers)
+            key = get_render_key(
+                state,
+                is_engine=is_engine,
+                resolution=resolution,
+                rgb=rgb,
+                layout=layout,
+                incremental=incremental,
+                headless=self.headless,
+            )
+            cached = cache.get(key)
+            if cached is not None and (filename is None or cached[1] is not None):
+                image, svg = cached
+                if filename is not None:
+                    with open(filename, "wb") as f:
+                        f.write(svg)
+                if out is not None:
+                    out[...] = image
+                    return out
+                return image.copy()
+
+        self._load(state, resolution, is_engine, filename, layout, incremental, workers)
+        if tile_size is not None:
+            image = render_tiled(self.gui.scene, self.gui.viewBox.sceneBoundingRect(), resolution, tile_size, rgb=rgb, out=out)
+        elif self.headless:
+            image = render_scene(self.gui.scene, self.gui.viewBox.sceneBoundingRect(), resolution, rgb=rgb, out=out)
+        else:
+            image = export_image(self.gui.scene, resolution, rgb=rgb, out=out)
+
+        if cache is not None:
+            svg = None
+            if filename is not None:
+                with open(filename, "rb") as f:
+                    svg = f.read()
+            # The cache takes ownership of a copy, which it makes read-only
+            cache.put(key, (image.copy(), svg))
+        return image
+
+    def render_png(
+        self,
+        state,
+        filename,
+        resolution=None,
+        is_engine=False,
+        layout="spring",
+        incremental=False,
+        workers=None,
+        rgb=False,
+        tile_size=1024,
+    ):
+        """
+        Render a graph to a png file in tiles, without allocating the full image, see :func:`render_png`.
+
+        :param filename: Path of the png file.
+        :return: The path of the png file.
+        """
+        resolution = self.resolution if resolution is None else check_resolution(resolution)
+        if not filename.endswith(".png"):
+            filename += ".png"
+        self._load(state, resolution, is_engine, None, layout, incremental, workers)
+        render_png(self.gui.scene, self.gui.viewBox.sceneBoundingRect(), resolution, filename, tile_size=tile_size, rgb=rgb)
+        return filename
+
+    def _load(self, state, resolution, is_engine, filename, layout, incremental, workers):
+        # Show the graph in the (reused) Gui, fitted to the resolution, and export it to an svg if a filename is provided
+        if self.gui is None:
+            self.gui = Gui(
+                state, is_engine=is_engine, layout=layout, incremental=incremental, workers=workers, headless=self.headless
+            )
+        else:
+            self.gui.layout = layout
+            self.gui.incremental = incremental
+            self.gui.workers = workers
+            self.gui.set_state(state, is_engine=is_engine)
+        if filename is not None and not filename.endswith(".svg"):
+            filename += ".svg"
+        if self.headless:
+            self.gui.viewBox.setGeometry(QtCore.QRectF(0, 0, *resolution))
+            self.gui.viewBox.autoRange(padding=0.04)
+            if filename is not None:
+                render_svg(self.gui.scene, filename, resolution)
+        else:
+            self._resize(self.gui.widget().view, resolution)
+            self.gui.viewBox.autoRange(padding=0.04)
+            if filename is not None:
+                svgexporter = pg.exporters.SVGExporter(self.gui.scene)
+                svgexporter.export(filename)
+
+    def render_many(self, jobs, stack=False, layout="spring", incremental=False, workers=None, rgb=False, cache=None):
+        """
+        Render many graphs in succession.
+
+        :param jobs: List with a state per graph, or tuples (state, is_engine, resolution, filename). Trailing elements of
+                     a tuple can be omitted, in which case is_engine=False, resolution=None and filename=None.
+        :param stack: If True, all images are rendered into a single array with shape (len(jobs), height, width, 4).
+                      All jobs must then have the same resolution. Otherwise, a generator of images is returned.
+        :param layout: Layout of nodes without a position, see :func:`eagerx_gui.utils.add_pos_to_state`.
+        :param incremental: Only position nodes without a position next to their neighbours.
+        :param workers: Number of processes, or an executor, to lay out loose clusters with.
+        :param rgb: Return RGB instead of RGBA images.
+        :param cache: Render cache, None to use the default cache (if set), or False to disable caching.
+        :return: The stacked array if stack is True, else a generator of images.
+        """
+        jobs = [self._get_job(job) for job in jobs]
+        kwargs = dict(layout=layout, incremental=incremental, workers=workers, rgb=rgb, cache=cache)
+        if not stack:
+            return (
+                self.render(state, resolution, is_engine, filename, **kwargs)
+                for state, is_engine, resolution, filename in jobs
+            )
+
+        resolutions = {tuple(resolution) for _, _, resolution, _ in jobs}
+        assert len(resolutions) <= 1, f"All jobs should have the same resolution to stack the images, but got {resolutions}."
+        width, height = resolutions.pop() if len(resolutions) > 0 else self.resolution
+        images = np.empty((len(jobs), height, width, 3 if rgb else 4), dtype=np.uint8)
+        for i, (state, is_engine, resolution, filename) in enumerate(jobs):
+            self.render(state, resolution, is_engine, filename, out=images[i], **kwargs)
+        return images
+
+    def _get_job(self, job):
+        if isinstance(job, dict):
+            job = (job,)
+        assert (
+            1 <= len(job) <= 4
+        ), f"Invalid job. Should be (state, is_engine, resolution, filename), but has length {len(job)}."
+        state, is_engine, resolution, filename = tuple(job) + (False, None, None)[len(job) - 1 :]
+        resolution = self.resolution if resolution is None else check_resolution(resolution)
+        return state, is_engine, resolution, filename
+
+    def close(self):
+        """Remove the graph from the scene. The session can still be used afterwards."""
+        if self.gui is not None:
+            self.gui.clear()
+
+    @staticmethod
+    def _resize(view, resolution):
+        # The view is never shown, so the resize event that lays out the view box is handled directly.
+        size = QtCore.QSize(*resolution)
+        old_size = view.size()
+        view.resize(size)
+        view.resizeEvent(QtGui.QResizeEvent(size, old_size))
+
+
+_render_session = None
+
+
+def get_render_session():
+    """Return the render session that is shared by all calls to :func:`eagerx_gui.render_gui`."""
+    global _render_session
+    if _render_session is None:
+        # Only render offscreen without a display, such that launch_gui can still show a window in the same process
+        has_display = not sys.platform.startswith("linux") or "DISPLAY" in os.environ or "WAYLAND_DISPLAY" in os.environ
+        _render_session = RenderSession(platform=None if has_display else "offscreen")
+    return _render_session
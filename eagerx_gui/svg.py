@@ -0,0 +1,269 @@
+"""
+Export graphs to svg without Qt, directly from the state.
+
+Nodes, terminals and connections are drawn with the same geometry as :class:`eagerx_gui.gui_node.NodeGraphicsItem` and
+:class:`eagerx_gui.gui_terminal.TerminalGraphicsItem`, with text widths estimated for the default font (DejaVu Sans, 12 px).
+"""
+
+from xml.sax.saxutils import escape
+
+from eagerx_gui import configuration
+from eagerx_gui.utils import add_pos_to_state, get_yaml_type
+
+FONT_FAMILY = "DejaVu Sans, sans-serif"
+FONT_SIZE = 12.0
+TEXT_ASCENT = 11.14
+TEXT_MARGIN = 4.0  # Document margin of a QGraphicsTextItem
+LABEL_HEIGHT = 22.0
+TERMINAL_SCALE = 0.7
+BOX_SIZE = 10.0
+NODE_SIZE = 125.0
+
+# Advance of the printable ascii characters in DejaVu Sans at 12 px
+_CHAR_WIDTHS = dict(
+    zip(
+        " !\"#$%&'()*+,-./0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_`abcdefghijklmnopqrstuvwxyz{|}~",
+        # fmt: off
+        [
+            3.81, 4.8, 5.52, 10.05, 7.62, 11.39, 9.34, 3.3, 4.67, 4.67, 6.0, 10.05, 3.81, 4.33, 3.81, 4.03, 7.62, 7.62, 7.62,
+            7.62, 7.62, 7.62, 7.62, 7.62, 7.62, 7.62, 4.03, 4.03, 10.05, 10.05, 10.05, 6.36, 12.0, 8.2, 8.22, 8.38, 9.23, 7.58,
+            6.89, 9.3, 9.02, 3.53, 3.53, 7.86, 6.67, 10.34, 8.97, 9.44, 7.23, 9.44, 8.33, 7.61, 7.33, 8.78, 8.2, 11.86, 8.22,
+            7.33, 8.22, 4.67, 4.03, 4.67, 10.05, 6.0, 6.0, 7.34, 7.61, 6.59, 7.61, 7.38, 4.22, 7.61, 7.59, 3.33, 3.33, 6.94,
+            3.33, 11.69, 7.59, 7.33, 7.61, 7.61, 4.92, 6.25, 4.7, 7.59, 7.09, 9.81, 7.09, 7.09, 6.3, 7.62, 4.03, 7.62, 10.05,
+        ],
+        # fmt: on
+    )
+)
+
+
+def text_width(text):
+    """Estimated width of a text in the default font."""
+    return sum(_CHAR_WIDTHS.get(char, 7.62) for char in text)
+
+
+def get_node_type(state, name, is_engine=False):
+    # Same as RxGuiNode.node_type
+    if is_engine:
+        return "engine_node"
+    elif name in ["env/actions", "env/observations", "env/render"]:
+        return name.split("/")[-1]
+    return get_yaml_type(state["nodes"][name])
+
+
+def get_terminals(params, node_type):
+    """
+    Returns the names of the input and output terminals of a node, in the order in which they are displayed.
+
+    :param params: The config of the node.
+    :param node_type: See :func:`get_node_type`.
+    :return: Tuple with a list of input terminals and a list of output terminals, e.g. "inputs/obs0".
+    """
+    inputs, outputs = [], []
+    for terminal_type in set.union(configuration.TERMS_IN, configuration.TERMS_OUT):
+        if node_type == "render" and terminal_type == "outputs":
+            continue
+        for terminal in params.get(terminal_type, []):
+            # Filter out terminals step, and set for actions, observations and render nodes
+            if (
+                (node_type == "actions" and (terminal_type == "inputs" or terminal == "set"))
+                or (node_type in ["observations", "render"] and terminal_type == "outputs")
+                or (node_type == "observations" and terminal == "actions_set")
+            ):
+                continue
+            names = [terminal_type + "/" + terminal]
+            if node_type == "reset_node" and terminal_type == "outputs":
+                names.append("feedthroughs/" + terminal)
+            for name in names:
+                (inputs if name.split("/")[0] in configuration.TERMS_IN else outputs).append(name)
+    return sorted(set(inputs)), sorted(set(outputs))
+
+
+def get_node_geometry(name, inputs, outputs):
+    """
+    Returns the size of a node and the anchor of each terminal, relative to the top left corner of the node.
+
+    :return: Tuple (width, height, anchors), where anchors maps each terminal to its (x, y) anchor.
+    """
+    width, height = NODE_SIZE, NODE_SIZE
+    label_width = text_width(name) + 2 * TEXT_MARGIN
+    if label_width > width - 5:
+        width = label_width + 5
+    step = TERMINAL_SCALE * LABEL_HEIGHT + 2
+    max_widths = []
+    for terminals in [inputs, outputs]:
+        widths = [BOX_SIZE + 1.5 + TERMINAL_SCALE * (text_width(t.split("/", 1)[1]) + 2 * TEXT_MARGIN) for t in terminals]
+        max_widths.append(max(widths + [0.0]))
+    y_max = LABEL_HEIGHT + 5 + step * max(len(inputs), len(outputs))
+    if y_max > height - 5:
+        height = y_max + 6
+    if sum(max_widths) > width - 10:
+        width = sum(max_widths) + 11
+    anchors = {}
+    for x, terminals in [(0.0, inputs), (width, outputs)]:
+        for i, terminal in enumerate(terminals):
+            anchors[terminal] = (x, LABEL_HEIGHT + 5 + step * i)
+    return width, height, anchors
+
+
+def _fill(rgb, alpha=255):
+    opacity = "" if alpha == 255 else f' fill-opacity="{alpha / 255:.3f}"'
+    return f'fill="rgb({rgb[0]},{rgb[1]},{rgb[2]})"{opacity}'
+
+
+def _stroke(rgb, alpha=255, width=1.0):
+    opacity = "" if alpha == 255 else f' stroke-opacity="{alpha / 255:.3f}"'
+    return f'stroke="rgb({rgb[0]},{rgb[1]},{rgb[2]})"{opacity} stroke-width="{width:g}"'
+
+
+def _text(text, x, y, scale=1.0, rgb=(0, 0, 0)):
+    # Position of a QGraphicsTextItem at (x, y), i.e. with the top left corner of its document margin at (x, y)
+    baseline = y + scale * (TEXT_MARGIN + TEXT_ASCENT)
+    return (
+        f'<text x="{x + scale * TEXT_MARGIN:.2f}" y="{baseline:.2f}" font-family="{FONT_FAMILY}" '
+        f'font-size="{scale * FONT_SIZE:g}px" {_fill(rgb)}>{escape(text)}</text>'
+    )
+
+
+def state_to_svg(state, is_engine=False, resolution=None, padding=0.04, layout="spring", background=(255, 255, 255)):
+    """
+    Draw a graph as svg without Qt.
+
+    Nodes without a position are positioned first with :func:`eagerx_gui.utils.add_pos_to_state`, which adds them to the
+    gui state.
+
+    :param state: State of the (engine) graph.
+    :param is_engine: True if state is the state of an engine graph.
+    :param resolution: Size [width, height] of the svg. If None, one unit in the graph is one pixel.
+    :param padding: Space around the nodes, as a fraction of the size of the graph.
+    :param layout: Layout of nodes without a position.
+    :param background: Color of the background, or None for a transparent background.
+    :return: The svg document.
+    """
+    add_pos_to_state(state, is_engine=is_engine, layout=layout)
+
+    # Nodes are drawn from left to right, like they are added to the Gui
+    nodes = {}
+    for name in sorted(state["nodes"].keys(), key=lambda name: state["gui_state"][name]["pos"][0]):
+        node_type = get_node_type(state, name, is_engine=is_engine)
+        inputs, outputs = get_terminals(state["nodes"][name]["config"], node_type)
+        width, height, anchors = get_node_geometry(name, inputs, outputs)
+        x, y = state["gui_state"][name]["pos"]
+        nodes[name] = dict(type=node_type, x=x, y=y, width=width, height=height, anchors=anchors)
+
+    connections = []
+    for source, target in state["connects"]:
+        source_name, target_name = source[0], target[0]
+        source_terminal, target_terminal = "/".join(source[1:3]), "/".join(target[1:3])
+        if source_name not in nodes or target_name not in nodes:
+            continue
+        source_node, target_node = nodes[source_name], nodes[target_name]
+        if source_terminal not in source_node["anchors"] or target_terminal not in target_node["anchors"]:
+            continue
+        start = _connect_point(source_node, source_terminal)
+        stop = _connect_point(target_node, target_terminal)
+        if target_terminal.split("/")[0] in configuration.TERMS_IN:
+            input_name, input_terminal = target_name, target_terminal
+        else:
+            input_name, input_terminal = source_name, source_terminal
+        linestyle = state["gui_state"].get(input_name, dict()).get("linestyle", dict())
+        if linestyle.get(input_terminal, "cubic") == "line":
+            path = f"M {start[0]:.2f} {start[1]:.2f} L {stop[0]:.2f} {stop[1]:.2f}"
+        else:
+            path = (
+                f"M {start[0]:.2f} {start[1]:.2f} C {stop[0]:.2f} {start[1]:.2f} {start[0]:.2f} {stop[1]:.2f} "
+                f"{stop[0]:.2f} {stop[1]:.2f}"
+            )
+        color = (255, 0, 0) if source_terminal.split("/")[0] in ["targets", "states"] else (0, 0, 255)
+        connections.append(f'<path d="{path}" fill="none" {_stroke(color, width=2.0)}/>')
+
+    elements = []
+    for name, node in nodes.items():
+        elements.append(_node_to_svg(state, name, node))
+
+    # Fit the view to the nodes, including their border
+    if len(nodes) > 0:
+        x_min = min(node["x"] for node in nodes.values()) - 5
+        y_min = min(node["y"] for node in nodes.values()) - 5
+        x_max = max(node["x"] + node["width"] for node in nodes.values()) + 5
+        y_max = max(node["y"] + node["height"] for node in nodes.values()) + 5
+    else:
+        x_min, y_min, x_max, y_max = 0, 0, NODE_SIZE, NODE_SIZE
+    dx, dy = padding * (x_max - x_min), padding * (y_max - y_min)
+    view_box = [x_min - dx, y_min - dy, x_max - x_min + 2 * dx, y_max - y_min + 2 * dy]
+    width, height = view_box[2:] if resolution is None else resolution
+
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8" standalone="no"?>',
+        f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" width="{width:g}" height="{height:g}" '
+        f'viewBox="{" ".join(f"{value:.2f}" for value in view_box)}">',
+    ]
+    if background is not None:
+        lines.append(
+            f'<rect x="{view_box[0]:.2f}" y="{view_box[1]:.2f}" width="{view_box[2]:.2f}" height="{view_box[3]:.2f}" '
+            f"{_fill(background)}/>"
+        )
+    lines.append("<g>")
+    lines.extend(connections)
+    lines.append("</g>")
+    lines.extend(elements)
+    lines.append("</svg>")
+    return "\n".join(lines) + "\n"
+
+
+def write_svg(state, filename, **kwargs):
+    """
+    Write a graph to an svg file without Qt, see :func:`state_to_svg` for the keyword arguments.
+
+    :return: The path of the svg file.
+    """
+    if not filename.endswith(".svg"):
+        filename += ".svg"
+    svg = state_to_svg(state, **kwargs)
+    with open(filename, "w") as f:
+        f.write(svg)
+    return filename
+
+
+def _get_box(terminal, x, y):
+    # Top left corner of the terminal box, where (x, y) is the anchor of the terminal
+    if terminal.split("/")[0] in configuration.TERMS_IN:
+        return x, y - (BOX_SIZE + 1) / 2
+    return x - BOX_SIZE - 1, y - (BOX_SIZE + 1) / 2
+
+
+def _connect_point(node, terminal):
+    # Center of the terminal box
+    box_x, box_y = _get_box(terminal, *node["anchors"][terminal])
+    return node["x"] + box_x + BOX_SIZE / 2, node["y"] + box_y + BOX_SIZE / 2
+
+
+def _node_to_svg(state, name, node):
+    params = state["nodes"][name]["config"]
+    color = configuration.GUI_COLORS.get(params.get("color", None), [200, 200, 200])
+    lines = [
+        f'<g transform="translate({node["x"]:.2f},{node["y"]:.2f})">',
+        f'<rect x="0" y="0" width="{node["width"]:.2f}" height="{node["height"]:.2f}" {_fill(color, 50)} '
+        f"{_stroke((0, 0, 0), 200, 2.0)}/>",
+        _text(name, node["width"] / 2 - (text_width(name) + 2 * TEXT_MARGIN) / 2, 0, rgb=(50, 50, 50)),
+    ]
+    for terminal, (x, y) in node["anchors"].items():
+        terminal_type, terminal_name = terminal.split("/", 1)
+        if terminal_type in ["targets", "states"]:
+            box_color = (255, 0, 0) if node["type"] == "object" else (128, 128, 128)
+        elif terminal_type == "feedthroughs":
+            box_color = (175, 238, 238)
+        else:
+            box_color = (0, 0, 255)
+        box_x, box_y = _get_box(terminal, x, y)
+        if terminal_type in configuration.TERMS_IN:
+            label_x = box_x + BOX_SIZE + 1
+        else:
+            label_x = box_x - TERMINAL_SCALE * (text_width(terminal_name) + 2 * TEXT_MARGIN)
+        label_y = y - TERMINAL_SCALE * LABEL_HEIGHT / 2
+        lines.append(
+            f'<rect x="{box_x:.2f}" y="{box_y:.2f}" width="{BOX_SIZE:g}" height="{BOX_SIZE:g}" '
+            f"{_fill(box_color)} {_stroke((0, 0, 0))}/>"
+        )
+        lines.append(_text(terminal_name, label_x, label_y, scale=TERMINAL_SCALE))
+    lines.append("</g>")
+    return "\n".join(lines)
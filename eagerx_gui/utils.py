@@ -1,6 +1,12 @@
 import numpy as np
 import networkx as nx
 import ast
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+from eagerx_gui import configuration
+from eagerx_gui.layout import force_layout, incremental_layout, layered_layout, rescale_layout
+from eagerx_gui.cache import get_layout_cache, get_layout_key
 
 
 def tryeval(val):
@@ -31,77 +37,154 @@ def get_yaml_type(yaml):
     return type
 
 
-def get_connected_nodes(state, node):
-    # Get a set of all the nodes that are connected directly to some node
-    connected_inputs = set()
-    connected_outputs = set()
+def get_adjacency(state):
+    """
+    Builds an index with the nodes that are directly connected to the inputs and outputs of each node.
+    Neighbours are stored as dict keys, i.e. as ordered sets in the order in which they were connected.
+    """
+    adjacency = {node: dict(inputs=dict(), outputs=dict()) for node in state["nodes"].keys()}
     for source, target in state["connects"]:
-        if source[0] == node:
-            connected_outputs.add(target[0])
-        elif target[0] == node:
-            connected_inputs.add(source[0])
-    return connected_inputs, connected_outputs
+        source_name, _, _ = source
+        target_name, _, _ = target
+        for name in [source_name, target_name]:
+            if name not in adjacency:
+                adjacency[name] = dict(inputs=dict(), outputs=dict())
+        adjacency[source_name]["outputs"][target_name] = None
+        if target_name != source_name:
+            adjacency[target_name]["inputs"][source_name] = None
+    return adjacency
+
+
+def get_connected_nodes(state, node, adjacency=None):
+    # Get a set of all the nodes that are connected directly to some node
+    if adjacency is None:
+        adjacency = get_adjacency(state)
+    if node not in adjacency:
+        return set(), set()
+    return set(adjacency[node]["inputs"]), set(adjacency[node]["outputs"])
 
 
-def is_connected_to_fixed(state, node, fixed_nodes, nodes_to_ignore=None):
+def is_connected_to_fixed(state, node, fixed_nodes, nodes_to_ignore=None, adjacency=None):
     # Check if node is connected to any fixed node (direct or indirect)
+    if adjacency is None:
+        adjacency = get_adjacency(state)
     if nodes_to_ignore is None:
         nodes_to_ignore = set()
     nodes_to_ignore.add(node)
-    connected_inputs, connected_outputs = get_connected_nodes(state, node)
-    connected_nodes = set.union(connected_inputs, connected_outputs)
-    for connected_node in connected_nodes:
-        if connected_node in nodes_to_ignore:
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current not in adjacency:
             continue
-        elif connected_node in fixed_nodes:
-            return True
-        elif is_connected_to_fixed(state, connected_node, fixed_nodes, nodes_to_ignore):
-            return True
+        for connected_node in {**adjacency[current]["inputs"], **adjacency[current]["outputs"]}:
+            if connected_node in nodes_to_ignore:
+                continue
+            elif connected_node in fixed_nodes:
+                return True
+            nodes_to_ignore.add(connected_node)
+            stack.append(connected_node)
     return False
 
 
-def get_longest_shortest_simple_paths(state, fixed_nodes=None):
+def get_graph(nodes, adjacency):
+    # Undirected graph of the provided nodes and the connections from their outputs
+    G = nx.Graph()
+    for node in nodes:
+        G.add_node(node)
+    for node in nodes:
+        for target in adjacency[node]["outputs"]:
+            G.add_edge(node, target)
+    return G
+
+
+def get_longest_shortest_simple_paths(state, fixed_nodes=None, adjacency=None):
     """
     Calculates shortest simple path for each fixed node as source and other node as target.
     Returns the longest for each fixed node.
+
+    A single breadth-first search per fixed node yields the distance and predecessor of every reachable node.
+    Successors are visited in the order in which they were connected, so the reconstructed path is the first shortest
+    path that would be found by enumerating all simple paths with :func:`networkx.all_simple_paths`.
     """
     if fixed_nodes is None:
         fixed_nodes = {}
 
-    G = nx.DiGraph()
+    # Successors in insertion order (dict keys), equal to the adjacency order of a networkx DiGraph.
+    if adjacency is None:
+        adjacency = get_adjacency(state)
+    successors = {node: neighbours["outputs"] for node, neighbours in adjacency.items()}
+
+    # Paths visiting every node are never shorter than this bound and were never selected as shortest path.
+    max_path_len = len(state["nodes"].keys())
     longest_shortest_simple_paths = {}
-    for node in state["nodes"].keys():
-        G.add_node(node)
-    for source, target in state["connects"]:
-        source_name, _, _ = source
-        target_name, _, _ = target
-        G.add_edge(source_name, target_name)
     for source in fixed_nodes:
-        longest_shortest_simple_path = []
         if source not in state["nodes"].keys():
             continue
+        distance, predecessor = _breadth_first_search(successors, source)
+        longest_shortest_simple_path = []
         for target in state["nodes"].keys():
             if source == target or ("env/observations" in [source, target] and "env/render" in [source, target]):
                 continue
-            if nx.has_path(G, source=source, target=target):
-                simple_paths = nx.all_simple_paths(G, source=source, target=target)
-                # Initialize shortest path length with max (i.e. number of nodes) such that each existing path would be shorter
-                shortest_path_len = len(state["nodes"].keys())
-                shortest_path = []
-                for simple_path in simple_paths:
-                    if len(simple_path) < shortest_path_len:
-                        shortest_path = simple_path
-                        shortest_path_len = len(shortest_path)
+            if target not in distance:
+                continue
+            shortest_path_len = distance[target] + 1
+            if shortest_path_len < max_path_len:
                 if shortest_path_len > len(longest_shortest_simple_path):
-                    longest_shortest_simple_path = shortest_path
+                    longest_shortest_simple_path = _reconstruct_path(predecessor, target)
+            elif max_path_len > len(longest_shortest_simple_path):
+                longest_shortest_simple_path = []
         longest_shortest_simple_paths[source] = longest_shortest_simple_path
     return longest_shortest_simple_paths
 
 
-def add_pos_to_state(state, is_engine=False):
+def _breadth_first_search(successors, source):
+    # Distance (in edges) and first discovered predecessor of every node reachable from source.
+    distance = {source: 0}
+    predecessor = {source: None}
+    frontier = [source]
+    while frontier:
+        next_frontier = []
+        for node in frontier:
+            for successor in successors[node]:
+                if successor not in distance:
+                    distance[successor] = distance[node] + 1
+                    predecessor[successor] = node
+                    next_frontier.append(successor)
+        frontier = next_frontier
+    return distance, predecessor
+
+
+def _reconstruct_path(predecessor, target):
+    path = []
+    node = target
+    while node is not None:
+        path.append(node)
+        node = predecessor[node]
+    return path[::-1]
+
+
+def add_pos_to_state(
+    state, is_engine=False, layout="spring", cache=None, incremental=False, iterations=50, threshold=1e-4, workers=None
+):
     """
     Position nodes using Fruchterman-Reingold force-directed algorithm.
+
+    With layout "layered", nodes are instead placed in layers from the actions (actuators) to the observations (sensors),
+    see :func:`eagerx_gui.layout.layered_layout`. Layout "force" uses the same force-directed algorithm as "spring", but
+    solves all clusters at once with NumPy, see :func:`eagerx_gui.layout.force_layout`. For both, the maximum number of
+    iterations and the convergence threshold can be set. Nodes for which the position is prescribed are never moved.
+
+    Layouts are looked up in and stored to the provided :class:`eagerx_gui.cache.LayoutCache`, or the cache returned by
+    :func:`eagerx_gui.cache.get_layout_cache` if None. Caching is disabled with `cache=False`.
+
+    If incremental is True and some nodes already have a position, only the other nodes are positioned next to their
+    neighbours, see :func:`eagerx_gui.layout.incremental_layout`.
+
+    With layout "spring", clusters that are not connected to the fixed nodes can be laid out in parallel by a number of
+    worker processes, or by an existing :class:`concurrent.futures.Executor`, see :func:`add_spring_pos_to_state`.
     """
+    assert layout in configuration.LAYOUTS, f"Invalid layout '{layout}'. Should be one of {configuration.LAYOUTS}."
+
     # Initialize fixed nodes
     left_nodes = {"actuators"} if is_engine else {"env/actions"}
     if is_engine:
@@ -115,18 +198,88 @@ def add_pos_to_state(state, is_engine=False):
     node_size = 150
 
     # Check for which nodes the position is prescribed
-    G = nx.Graph()
+    prescribed = dict()
     for node, params in state["nodes"].items():
-        G.add_node(node)
         if node not in state["gui_state"]:
             state["gui_state"][node] = empty_gui_state()  # Add gui states here.
         gui_state = state["gui_state"][node]
         if gui_state.get("pos", None) is not None and len(gui_state["pos"]) == 2:
             fixed_nodes.add(node)
-    for source, target in state["connects"]:
-        source_name, _, _ = source
-        target_name, _, _ = target
-        G.add_edge(source_name, target_name)
+            prescribed[node] = gui_state["pos"]
+
+    # Only position new nodes
+    if incremental and len(prescribed) > 0:
+        adjacency = get_adjacency(state)
+        positions = incremental_layout(state["nodes"].keys(), adjacency, prescribed, node_size=node_size)
+        for node, pos in positions.items():
+            state["gui_state"][node]["pos"] = pos
+        return state
+
+    # Reuse the positions of a graph with the same topology
+    if cache is None:
+        cache = get_layout_cache()
+    elif cache is False:
+        cache = None
+    if cache is not None:
+        key = get_layout_key(state, is_engine=is_engine, layout=layout, iterations=iterations, threshold=threshold)
+        positions = cache.get(key)
+        if positions is not None:
+            for node, pos in positions.items():
+                state["gui_state"][node]["pos"] = list(pos)
+            return state
+
+    adjacency = get_adjacency(state)
+    if layout == "layered":
+        positions = layered_layout(list(state["nodes"].keys()), adjacency, left_nodes, right_nodes, node_size=node_size)
+        for node, pos in positions.items():
+            gui_state = state["gui_state"][node]
+            if gui_state.get("pos", None) is None or len(gui_state["pos"]) != 2:
+                gui_state["pos"] = pos
+    else:
+        add_spring_pos_to_state(
+            state,
+            adjacency,
+            left_nodes,
+            right_nodes,
+            fixed_nodes,
+            node_size=node_size,
+            solver="numpy" if layout == "force" else "networkx",
+            iterations=iterations,
+            threshold=threshold,
+            workers=workers,
+        )
+
+    if cache is not None:
+        positions = {node: state["gui_state"][node]["pos"] for node in state["nodes"].keys()}
+        cache.put(key, {node: pos for node, pos in positions.items() if pos is not None})
+    return state
+
+
+def add_spring_pos_to_state(
+    state,
+    adjacency,
+    left_nodes,
+    right_nodes,
+    fixed_nodes,
+    node_size=150,
+    solver="networkx",
+    iterations=50,
+    threshold=1e-4,
+    workers=None,
+):
+    """
+    Position nodes that are not in fixed_nodes using Fruchterman-Reingold force-directed algorithm.
+    Clusters that are not connected to any fixed node are placed below the others.
+
+    With solver "networkx", each cluster is laid out with :func:`networkx.spring_layout`. With solver "numpy", all clusters
+    are laid out at once with :func:`eagerx_gui.layout.force_layout`.
+
+    :param workers: Only used with solver "networkx". Either the number of processes that lay out the clusters that are
+                    not connected to a fixed node in parallel, or an :class:`concurrent.futures.Executor` to do so.
+                    The processes are spawned, so reuse an executor to avoid their start-up time. If None, all clusters
+                    are laid out in this process. The clusters are always stacked in the same order.
+    """
+    G = get_graph(adjacency.keys(), adjacency)
 
     fixed_clusters = []
     loose_clusters = []
@@ -144,17 +297,12 @@ def add_pos_to_state(state, is_engine=False):
             loose_clusters.append(cluster)
 
     # Create Graph
-    G = nx.Graph()
-    for node in fixed_cluster_nodes:
-        G.add_node(node)
-    for source, target in state["connects"]:
-        source_name, _, _ = source
-        target_name, _, _ = target
-        if source_name in fixed_cluster_nodes:
-            G.add_edge(source_name, target_name)
+    G = get_graph(fixed_cluster_nodes, adjacency)
 
     # Get longest path in order to set x locations
-    longest_shortest_simple_paths = get_longest_shortest_simple_paths(state, fixed_nodes=set.union(left_nodes, right_nodes))
+    longest_shortest_simple_paths = get_longest_shortest_simple_paths(
+        state, fixed_nodes=set.union(left_nodes, right_nodes), adjacency=adjacency
+    )
 
     x_max = 0
     left_max = 0
@@ -186,7 +334,7 @@ def add_pos_to_state(state, is_engine=False):
     connected_clusters = {}
     y_pos = {}
     for fixed_node in fixed_nodes:
-        connected_inputs, connected_outputs = get_connected_nodes(state, fixed_node)
+        connected_inputs, connected_outputs = get_connected_nodes(state, fixed_node, adjacency=adjacency)
         if fixed_node in left_nodes:
             left_connected_clusters[fixed_node] = {}
             left_connected_clusters[fixed_node]["in"] = connected_inputs
@@ -241,10 +389,45 @@ def add_pos_to_state(state, is_engine=False):
                             fixed_positions[node] = [x_pos_cluster, fixed_positions[key][1] + y_pos[key][direction]]
                             y_pos[key][direction] += node_size
                             break
-    if len(G.nodes()) > 0:
-        position_dict = nx.spring_layout(G, k=1.5 * 150, pos=fixed_positions, fixed=fixed_positions.keys())
+    loose_graphs = [get_graph(sorted(loose_cluster), adjacency) for loose_cluster in loose_clusters]
+    if solver == "numpy":
+        position_dict, loose_position_dicts = _force_layout_graphs(
+            G, fixed_positions, loose_graphs, k=1.5 * 150, iterations=iterations, threshold=threshold
+        )
     else:
-        position_dict = {}
+        executor = None
+        chunksize = 1
+        if isinstance(workers, Executor):
+            executor = workers
+        elif workers is not None and workers > 1 and len(loose_graphs) > 1:
+            num_workers = min(workers, len(loose_graphs))
+            # Spawned instead of forked, because forking a process with a running QApplication (and its threads) can deadlock
+            executor = ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context("spawn"))
+            chunksize = max(1, len(loose_graphs) // (4 * num_workers))
+        try:
+            if executor is not None:
+                # Clusters are submitted right away, such that they are laid out while this process handles the fixed nodes
+                clusters = [(list(graph.nodes()), list(graph.edges()), iterations, threshold) for graph in loose_graphs]
+                loose_position_dicts = executor.map(_spring_layout_cluster, clusters, chunksize=chunksize)
+            else:
+                loose_position_dicts = [
+                    nx.spring_layout(G, k=1, iterations=iterations, threshold=threshold) for G in loose_graphs
+                ]
+            if len(G.nodes()) > 0:
+                position_dict = nx.spring_layout(
+                    G,
+                    k=1.5 * 150,
+                    pos=fixed_positions,
+                    fixed=fixed_positions.keys(),
+                    iterations=iterations,
+                    threshold=threshold,
+                )
+            else:
+                position_dict = {}
+            loose_position_dicts = list(loose_position_dicts)  # Results are returned in the order of submission
+        finally:
+            if executor is not None and executor is not workers:
+                executor.shutdown()
     for node, pos in position_dict.items():
         state["gui_state"][node]["pos"] = pos.tolist()
     if len(position_dict.values()) > 0:
@@ -252,16 +435,7 @@ def add_pos_to_state(state, is_engine=False):
     else:
         y_offset = 0
     x_offset = x_max // 2
-    for loose_cluster in loose_clusters:
-        G = nx.Graph()
-        for node in sorted(loose_cluster):
-            G.add_node(node)
-        for source, target in state["connects"]:
-            source_name, _, _ = source
-            target_name, _, _ = target
-            if source_name in loose_cluster:
-                G.add_edge(source_name, target_name)
-        position_dict = nx.spring_layout(G, k=1)
+    for position_dict in loose_position_dicts:
         height = (
             abs(
                 np.max(np.array(list(position_dict.values()))[:, 1]) + np.min(np.array(list(position_dict.values()))[:, 1]) + 2
@@ -277,3 +451,50 @@ def add_pos_to_state(state, is_engine=False):
             state["gui_state"][node]["pos"] = pos.tolist()
         y_offset += height // 2
     return state
+
+
+def _spring_layout_cluster(cluster):
+    # Lay out a single cluster in a worker process. Only the nodes and edges are sent, which is cheaper than a Graph.
+    nodes, edges, iterations, threshold = cluster
+    G = nx.Graph()
+    G.add_nodes_from(nodes)
+    G.add_edges_from(edges)
+    return nx.spring_layout(G, k=1, iterations=iterations, threshold=threshold)
+
+
+def _force_layout_graphs(G, fixed_positions, loose_graphs, k, iterations=50, threshold=1e-4):
+    # Lay out the cluster(s) with fixed nodes and all loose clusters in a single batch.
+    # Initial positions are spread over an area that scales with the number of nodes, such that the grid approximation of
+    # the repulsive forces remains effective for large clusters. Loose clusters are rescaled to [-1, 1] afterwards.
+    rng = np.random.default_rng()
+    graphs = [G] + loose_graphs
+    nodes = [node for graph in graphs for node in graph.nodes()]
+    index = {node: i for i, node in enumerate(nodes)}
+    pos = np.zeros((len(nodes), 2))
+    node_k = np.ones(len(nodes))
+    clusters = np.zeros(len(nodes), dtype=np.int64)
+    pinned = np.zeros(len(nodes), dtype=bool)
+    edges = []
+    start = 0
+    for cluster, graph in enumerate(graphs):
+        size = len(graph)
+        if cluster == 0:
+            dom_size = max([abs(value) for pos_tup in fixed_positions.values() for value in pos_tup] + [np.sqrt(size) * k])
+            pos[start : start + size] = rng.random((size, 2)) * dom_size
+            node_k[start : start + size] = k
+            for node, fixed_pos in fixed_positions.items():
+                pos[index[node]] = fixed_pos
+                pinned[index[node]] = True
+        else:
+            pos[start : start + size] = rng.random((size, 2)) * np.sqrt(size)
+        clusters[start : start + size] = cluster
+        edges.extend([index[source], index[target]] for source, target in graph.edges())
+        start += size
+    pos = force_layout(pos, edges, k=node_k, clusters=clusters, pinned=pinned, iterations=iterations, threshold=threshold)
+
+    position_dict = {node: pos[index[node]] for node in G.nodes()}
+    loose_position_dicts = []
+    for graph in loose_graphs:
+        cluster_pos = rescale_layout(pos[[index[node] for node in graph.nodes()]])
+        loose_position_dicts.append(dict(zip(graph.nodes(), cluster_pos)))
+    return position_dict, loose_position_dicts
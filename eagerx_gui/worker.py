@@ -0,0 +1,194 @@
+"""
+Render graphs in a background process.
+
+The worker process owns the QApplication and a :class:`eagerx_gui.render.RenderSession`, so that neither Qt nor the Gui
+is initialized in the calling process. States are sent to the worker over a queue, and the worker renders the images
+directly into shared memory that was allocated by the calling process.
+"""
+
+import asyncio
+import itertools
+import multiprocessing
+import threading
+from concurrent.futures import Future
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty
+
+import numpy as np
+
+
+def _worker_main(requests, results, resolution, platform, headless):
+    from eagerx_gui.render import RenderSession
+
+    session = RenderSession(resolution=resolution, platform=platform, headless=headless)
+    results.put(None)  # Ready
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        job_id, shm_name, shape, kwargs = request
+        try:
+            shm = SharedMemory(name=shm_name)
+            try:
+                out = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+                session.render(out=out, **kwargs)
+                del out
+            finally:
+                shm.close()
+            results.put((job_id, None))
+        except Exception as e:
+            try:
+                results.put((job_id, e))
+            except Exception:
+                # The exception cannot be pickled
+                results.put((job_id, RuntimeError(repr(e))))
+    session.close()
+
+
+class AsyncRenderer(object):
+    """
+    Renders graphs in a long-lived worker process, without blocking the calling thread.
+
+    The worker is started with the "spawn" start method, so the calling process never initializes Qt. Renders are
+    handled one after the other, in the order in which they are submitted.
+
+    :param resolution: Default resolution [width, height] of the rendered images.
+    :param platform: Qt platform plugin of the worker, see :func:`eagerx_gui.render.get_application`.
+    :param headless: Only create the scene with the graph in the worker, see :class:`eagerx_gui.render.RenderSession`.
+    """
+
+    def __init__(self, resolution=None, platform="offscreen", headless=True):
+        self.resolution = [1920, 1080] if resolution is None else [int(resolution[0]), int(resolution[1])]
+        context = multiprocessing.get_context("spawn")
+        self._requests = context.Queue()
+        self._results = context.Queue()
+        self._process = context.Process(
+            target=_worker_main,
+            args=(self._requests, self._results, self.resolution, platform, headless),
+            daemon=True,
+        )
+        self._process.start()
+        self._ids = itertools.count()
+        self._pending = dict()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stopped = False  # Set once the pending futures are failed, after the worker stopped
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._receive, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def submit(
+        self,
+        state,
+        resolution=None,
+        is_engine=False,
+        filename=None,
+        layout="spring",
+        incremental=False,
+        rgb=False,
+        out=None,
+        cache=None,
+    ):
+        """
+        Render a graph in the worker process, see :meth:`eagerx_gui.render.RenderSession.render` for the arguments.
+
+        The state is copied to the worker, so it can be modified while the graph is rendered, and positions that are added
+        by the layout are not written back to it. The cache is the cache of the worker process.
+
+        :param out: Preallocated array to copy the image into, see :func:`eagerx_gui.render.export_image`. Must not be
+                    accessed until the future is done.
+        :return: A :class:`concurrent.futures.Future` of the image. It fails with a RuntimeError if the worker stopped.
+        """
+        assert not self._closed, "The renderer is closed."
+        resolution = self.resolution if resolution is None else [int(resolution[0]), int(resolution[1])]
+        shape = (resolution[1], resolution[0], 3 if rgb else 4)
+        if out is not None:
+            assert out.dtype == np.uint8, f"Invalid dtype of argument out. Should be uint8, but is {out.dtype}."
+            assert out.shape == shape, f"Invalid shape of argument out. Should be {shape}, but is {out.shape}."
+        kwargs = dict(
+            state=state,
+            resolution=resolution,
+            is_engine=is_engine,
+            filename=filename,
+            layout=layout,
+            incremental=incremental,
+            rgb=rgb,
+            cache=cache,
+        )
+        future = Future()
+        future.set_running_or_notify_cancel()
+        with self._lock:
+            if self._stopped:
+                future.set_exception(RuntimeError("The render worker stopped before the graph was rendered."))
+                return future
+            shm = SharedMemory(create=True, size=int(np.prod(shape)))
+            job_id = next(self._ids)
+            self._pending[job_id] = (future, shm, shape, out)
+        self._requests.put((job_id, shm.name, shape, kwargs))
+        return future
+
+    def render_async(self, *args, **kwargs):
+        """Same as :meth:`submit`, but returns an awaitable for the event loop of asyncio."""
+        return asyncio.wrap_future(self.submit(*args, **kwargs))
+
+    def wait_ready(self, timeout=None):
+        """Wait until the worker has initialized Qt. Returns False on timeout, or if the worker stopped."""
+        return self._ready.wait(timeout) and self._process.is_alive()
+
+    def close(self, timeout=None):
+        """Stop the worker process after the submitted renders are done."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._process.is_alive():
+            self._requests.put(None)
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._thread.join()
+
+    def _receive(self):
+        # Resolves the futures with the images in shared memory, until the worker has stopped
+        while True:
+            try:
+                result = self._results.get(timeout=0.1)
+            except Empty:
+                if self._process.is_alive():
+                    continue
+                self._ready.set()
+                break
+            if result is None:
+                self._ready.set()
+                continue
+            job_id, error = result
+            with self._lock:
+                future, shm, shape, out = self._pending.pop(job_id)
+            try:
+                if error is None:
+                    image = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+                    if out is None:
+                        out = image.copy()
+                    else:
+                        out[...] = image
+                    del image
+            finally:
+                shm.close()
+                shm.unlink()
+            if error is None:
+                future.set_result(out)
+            else:
+                future.set_exception(error)
+        with self._lock:
+            self._stopped = True
+            pending, self._pending = self._pending, dict()
+        for future, shm, _, _ in pending.values():
+            shm.close()
+            shm.unlink()
+            future.set_exception(RuntimeError("The render worker stopped before the graph was rendered."))
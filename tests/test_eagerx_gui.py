@@ -1,9 +1,458 @@
+import asyncio
+import os
+import subprocess
+import sys
+from collections import Counter
+from copy import deepcopy
+
+import eagerx
+import numpy as np
+import pyqtgraph as pg
+from pyqtgraph import functions as fn
 from eagerx.core.graph import Graph
+from eagerx.engines.openai_gym.objects import GymObject
+from eagerx_gui import configuration, gui_node
+from eagerx_gui.cache import RenderCache, get_render_cache
 from eagerx_gui.gui import Gui
-from pyqtgraph.Qt import QtWidgets
+from eagerx_gui.gui_node import RxGuiNode
+from eagerx_gui.gui_terminal import ConnectionItem, get_pen
+from eagerx_gui.render import RenderSession, export_image, get_application, render_scene
+from eagerx_gui.svg import _connect_point, get_node_geometry, get_node_type, get_terminals, write_svg
+from eagerx_gui.worker import AsyncRenderer
+from pyqtgraph.Qt import QtCore, QtGui, QtWidgets
+
+
+def _create_state(num_objects):
+    objects = [GymObject.make(f"obj{i}", env_id="Pendulum-v1", rate=20) for i in range(num_objects)]
+    graph = eagerx.Graph.create(objects=objects)
+    for i, obj in enumerate(objects):
+        graph.connect(source=obj.sensors.observation, observation=f"obs{i}", window=1)
+        graph.connect(action=f"act{i}", target=obj.actuators.action, window=1)
+    state = deepcopy(graph._state)
+    Graph._substitute_environment_node(state)
+    return state
 
 
 def test_gui():
     graph = Graph.create()
     app = QtWidgets.QApplication([])
     gui = Gui(graph._state)
+
+
+def test_load_state():
+    app = get_application()
+    state = _create_state(3)
+    gui = Gui(deepcopy(state), headless=True)
+    app.processEvents()
+    assert not gui.loading
+    assert gui.scene.itemIndexMethod() == QtWidgets.QGraphicsScene.ItemIndexMethod.BspTreeIndex
+
+    # Every connection is added to the view box once, with a line between the terminals that were laid out in bulk
+    connections = [item for item in gui.viewBox.addedItems if isinstance(item, ConnectionItem)]
+    assert len(connections) == len(set(connections)) == len(state["connects"])
+    assert len(gui.viewBox.addedItems) == len(state["connects"]) + len(state["nodes"])
+    for connection in connections:
+        start = connection.path.elementAt(0)
+        assert QtCore.QPointF(start.x, start.y) == connection.source.connect_point()
+    item = gui.nodes["obj0"].graphics_item()
+    assert item.bounds.height() == 125 and len(item.terminals) == len(gui.nodes["obj0"].terminals)
+
+
+def test_update_terminals():
+    app = get_application()
+    gui = Gui(_create_state(12), headless=True)
+    app.processEvents()
+
+    # A node created outside of load_state is laid out the same as the nodes that were loaded in bulk
+    loaded = gui.nodes["env/observations"].graphics_item()
+    item = RxGuiNode("env/observations", gui).graphics_item()
+    assert item.bounds == loaded.bounds and item.bounds.height() > 125
+    assert len(item.terminals) == len(loaded.terminals) == 12
+    for name, (_, terminal) in item.terminals.items():
+        assert terminal.anchorPos == loaded.terminals[name][1].anchorPos
+        assert terminal.size() == terminal.boundingRect().size()
+
+
+def test_level_of_detail():
+    app = get_application()
+    gui = Gui(_create_state(2), headless=True, lod_threshold=0.5)
+    app.processEvents()
+    node = gui.nodes["obj0"].graphics_item()
+    terminal = gui.nodes["obj0"].terminals["sensors/observation"]
+    connection = list(terminal.connections.values())[0]
+    assert gui.detailed and node.nameItem.isVisible() and connection.path.elementCount() == 4
+
+    def zoom(scale):
+        # The headless view box is 1000 pixels wide
+        gui.viewBox.setRange(QtCore.QRectF(0, 0, 1000 / scale, 600 / scale), padding=0)
+
+    # Zoomed out, details are hidden and connections are straight lines
+    zoom(0.2)
+    assert not gui.detailed and not node.nameItem.isVisible()
+    assert not terminal.graphics_item().box.isVisible() and not terminal.graphics_item().label.isVisible()
+    assert connection.path.elementCount() == 2
+
+    # Details are only shown again somewhat above the threshold
+    zoom(0.55)
+    assert not gui.detailed
+    zoom(1.0)
+    assert gui.detailed and node.nameItem.isVisible() and terminal.graphics_item().box.isVisible()
+    assert connection.path.elementCount() == 4
+
+    # Graphs that are loaded while zoomed out are not detailed either
+    zoom(0.2)
+    gui.set_state(_create_state(1))
+    zoom(0.2)
+    assert not gui.detailed and not gui.nodes["obj0"].graphics_item().nameItem.isVisible()
+
+
+def test_connection_batch():
+    state = _create_state(3)
+    session = RenderSession(resolution=[400, 300], headless=False)
+    image = session.render(deepcopy(state), cache=False)
+    gui = Gui(deepcopy(state), batch_connections=True)
+    RenderSession._resize(gui.widget().view, [400, 300])
+    gui.viewBox.autoRange(padding=0.04)
+    batch = gui.connection_batch
+    assert len(batch.connections) == len(state["connects"])
+    assert (np.abs(export_image(gui.scene, [400, 300]).astype(int) - image) > 64).mean() < 0.001
+
+    # Selected connections are drawn by themselves
+    connection = batch.connections[0]
+    num_elements = sum(path.elementCount() for path in batch.get_paths().values())
+    connection.setSelected(True)
+    assert sum(path.elementCount() for path in batch.get_paths().values()) == num_elements - connection.path.elementCount()
+
+    # Pens are shared, and shapes are only stroked again after zooming to another bucket
+    assert get_pen((0, 0, 255, 255), 2.0) is get_pen([0, 0, 255, 255], 2.0)
+    shape = connection.shape()
+    gui.viewBox.translateBy(x=10, y=0)
+    assert connection.shape() is shape
+    connection.viewRect()  # Cached until the transform of the view box changes
+    gui.viewBox.scaleBy(s=(4, 4))
+    export_image(gui.scene, [400, 300])  # The transform of the view box is updated before painting
+    assert connection.shape() is not shape
+    assert connection.mapRectToView(connection.viewRect()) == gui.viewBox.viewRect()
+
+
+def test_z_value():
+    session = RenderSession(resolution=[400, 300])
+    session.render(_create_state(2), cache=False)
+    item = session.gui.nodes["obj0"].graphics_item()
+    z_values = {name: node.graphics_item().zValue() for name, node in session.gui.nodes.items()}
+
+    # Painting does not change the z values, and every node is painted once per render
+    gui_node.paint_counter = Counter()
+    try:
+        render_scene(session.gui.scene, session.gui.viewBox.sceneBoundingRect(), [400, 300])
+        assert gui_node.paint_counter == Counter({name: 1 for name in session.gui.nodes.keys()})
+    finally:
+        gui_node.paint_counter = None
+    assert {name: node.graphics_item().zValue() for name, node in session.gui.nodes.items()} == z_values
+    assert len(set(z_values.values())) == len(z_values)
+
+    # Hovered and selected nodes are raised
+    item.set_hovered(True)
+    assert item.zValue() == 200
+    item.set_hovered(False)
+    assert item.zValue() == z_values["obj0"]
+    item.setSelected(True)
+    assert item.zValue() == 200
+    item.setSelected(False)
+    assert item.zValue() == z_values["obj0"]
+
+
+def test_drag():
+    app = get_application()
+    gui = Gui(_create_state(2), headless=True)
+    app.processEvents()
+    moved = Gui(_create_state(2), headless=True)
+    items = [gui.nodes[name].graphics_item() for name in ["obj0", "env/observations"]]
+    connection = gui.nodes["obj0"].terminals["sensors/observation"].connections
+    connection = next(iter(connection.values()))
+    path = connection.path
+
+    # While dragging, connections and the state are only updated after the moves are flushed
+    gui.dragging = True
+    for _ in range(3):
+        for item in items:
+            item.setPos(item.pos() + QtCore.QPointF(10, 5))
+    assert connection.path is path
+    assert gui.graph._state["gui_state"] == moved.graph._state["gui_state"]
+    QtCore.QThread.msleep(gui.drag_interval + 10)
+    app.processEvents()  # Flushed by the timer
+    assert connection.path is not path
+    assert gui.graph._state["gui_state"] == moved.graph._state["gui_state"]
+    gui.finish_drag()
+    assert not gui.dragging
+
+    # Same result as moving the nodes programmatically, which is applied immediately
+    for name in ["obj0", "env/observations"]:
+        item = moved.nodes[name].graphics_item()
+        item.setPos(item.pos() + QtCore.QPointF(30, 15))
+    assert gui.graph._state["gui_state"] == moved.graph._state["gui_state"]
+    other = next(iter(moved.nodes["obj0"].terminals["sensors/observation"].connections.values()))
+    assert connection.path == other.path
+
+    # Replacing the state during a drag stops it, so that later moves are applied immediately again
+    gui.dragging = True
+    gui.set_state(_create_state(1))
+    item = gui.nodes["obj0"].graphics_item()
+    item.setPos(item.pos() + QtCore.QPointF(10, 5))
+    assert not gui.dragging and gui.graph._state["gui_state"]["obj0"]["pos"] == [item.pos().x(), item.pos().y()]
+
+
+def test_hover_text():
+    app = get_application()
+    gui = Gui(_create_state(2))
+    app.processEvents()
+    widget = gui.widget()
+    changes = []
+    widget.hoverText.textChanged.connect(lambda: changes.append(widget.hoverText.toPlainText()))
+    node = gui.nodes["env/observations"]
+    terminal = node.terminals["inputs/obs0"]
+    assert node.hover_text() is node.hover_text() and terminal.hover_text() is terminal.hover_text()
+    assert terminal.hover_text().startswith("name: obs0\n") and "address" not in terminal.hover_text()
+    assert "rate" not in terminal.hover_text() and "\nrate: " not in "\n" + node.hover_text()
+    assert configuration.get_hidden_keys("term", "observations", "inputs") == {"address", "sync", "rate"}
+
+    # The text is only replaced when it changes
+    for _ in range(3):
+        widget.hover_over([terminal.graphics_item(), node.graphics_item()])
+    widget.hover_over([node.graphics_item()])
+    widget.hover_over([node.graphics_item()])
+    widget.hover_over([])
+    assert changes == [terminal.hover_text(), node.hover_text(), ""]
+    assert widget.hoverItem is None
+
+    # The cached text is replaced after invalidation
+    state = gui.graph._state["nodes"]["obj0"]
+    state["config"] = dict(gui.nodes["obj0"].params(), color="red")
+    assert "color: red" not in gui.nodes["obj0"].hover_text()
+    gui.invalidate_params("obj0")
+    assert "color: red" in gui.nodes["obj0"].hover_text()
+
+
+def test_scene_options():
+    app = get_application()
+    state = _create_state(3)
+    gui = Gui(deepcopy(state), headless=True, scene_index="none", cull_connections=True, cache_nodes=True)
+    app.processEvents()
+    assert gui.scene.itemIndexMethod() == QtWidgets.QGraphicsScene.ItemIndexMethod.NoIndex
+    item = gui.nodes["obj0"].graphics_item()
+    assert item.cacheMode() == item.CacheMode.DeviceCoordinateCache
+    bsp = Gui(deepcopy(state), headless=True, bsp_depth=4)
+    assert bsp.scene.itemIndexMethod() == QtWidgets.QGraphicsScene.ItemIndexMethod.BspTreeIndex
+    assert bsp.scene.bspTreeDepth() == 4
+
+    # Only connections outside of the view box are hidden, and the graph renders the same as without these options
+    connections = gui.get_connections()
+    assert len(connections) == len(state["connects"]) and all(c.isVisible() for c in connections)
+    image = render_scene(gui.scene, gui.viewBox.sceneBoundingRect(), [400, 300])
+    expected = render_scene(bsp.scene, bsp.viewBox.sceneBoundingRect(), [400, 300])
+    assert (np.abs(image.astype(int) - expected) > 64).mean() < 0.01
+    bounds = item.mapRectToParent(item.boundingRect())
+    gui.viewBox.setRange(bounds.translated(0, -10 * bounds.height()), padding=0)
+    assert not any(c.isVisible() for c in connections)
+    gui.viewBox.setRange(bounds, padding=0)
+    visible = [c for c in connections if c.isVisible()]
+    assert 0 < len(visible) < len(connections)
+    assert all(item in [c.source.parentItem(), c.target.parentItem()] for c in visible)
+
+    # Connections that are moved into the view box are shown again
+    hidden = next(c for c in connections if not c.isVisible())
+    hidden.target.parentItem().setPos(item.pos())
+    assert hidden.isVisible()
+
+
+def test_params():
+    app = get_application()
+    gui = Gui(_create_state(2), headless=True)
+    app.processEvents()
+    node = gui.nodes["obj0"]
+    terminal = node.terminals["sensors/observation"]
+    assert node.params() is node.params() and terminal.params() is terminal.params()
+    assert node.params().get("color", None) != "red"
+
+    # The cached params are replaced after invalidation
+    state = gui.graph._state["nodes"]["obj0"]
+    state["config"] = dict(node.params(), color="red")
+    state["sensors"]["observation"] = dict(terminal.params(), rate=1)
+    assert node.params().get("color", None) != "red" and terminal.params()["rate"] != 1
+    gui.invalidate_params("obj0")
+    assert node.params()["color"] == "red" and terminal.params()["rate"] == 1
+    assert node.graphics_item().brush.color().getRgb()[:3] == (255, 0, 0)
+    assert gui.nodes["obj1"].params().get("color", None) != "red"
+
+
+def test_render_session():
+    state = _create_state(3)
+    session = RenderSession(resolution=[320, 240])
+    image = session.render(deepcopy(state), cache=False)
+    assert image.shape == (240, 320, 4)
+    num_items = len(session.gui.scene.items())
+
+    # The widget is reused for other graphs, without leaving items of previous graphs behind
+    other = session.render(_create_state(1), resolution=[200, 100], cache=False)
+    assert other.shape == (100, 200, 4)
+    assert set(session.gui.nodes.keys()) == {"env/actions", "env/observations", "obj0"}
+    assert (session.render(deepcopy(state), cache=False) == image).all()
+    assert len(session.gui.scene.items()) == num_items
+    assert session.gui._widget is None
+
+
+def test_headless_render(tmp_path):
+    state = _create_state(3)
+    headless = RenderSession(resolution=[400, 250]).render(deepcopy(state), filename=str(tmp_path / "graph"))
+    session = RenderSession(resolution=[400, 250], headless=False)
+    image = session.render(deepcopy(state))
+    assert not session.gui.widget().isVisible()
+
+    # Both render the same graph, apart from small differences in anti-aliasing
+    assert (np.abs(headless.astype(int) - image) > 64).mean() < 0.02
+    assert (tmp_path / "graph.svg").read_text().count("obj0") == 1
+
+
+def test_export_image():
+    session = RenderSession(resolution=[320, 240], headless=False)
+    image = session.render(_create_state(2))
+    session.render(_create_state(1), resolution=[200, 100], cache=False)
+    assert session.gui.viewBox.geometry() == QtCore.QRectF(0, 0, 200, 100)
+    image = session.render(_create_state(2), cache=False)
+    assert session.gui.viewBox.geometry() == QtCore.QRectF(0, 0, 320, 240)
+
+    # Same pixels as exporting to a QImage with pyqtgraph
+    exporter = pg.exporters.ImageExporter(session.gui.scene)
+    exporter.parameters()["width"] = 320
+    exporter.parameters()["height"] = 240
+    expected = fn.ndarray_from_qimage(exporter.export(toBytes=True))[..., [2, 1, 0, 3]]
+    assert np.abs(image.astype(int) - expected).max() <= 1
+
+    out = np.zeros((240, 320, 3), dtype=np.uint8)
+    assert export_image(session.gui.scene, [320, 240], rgb=True, out=out) is out
+    assert np.abs(out.astype(int) - expected[..., :3]).max() <= 1
+
+
+def test_render_many():
+    states = [_create_state(1), _create_state(2)]
+    session = RenderSession(resolution=[160, 120])
+    images = session.render_many([deepcopy(states[0]), (deepcopy(states[1]), False)], stack=True, rgb=True)
+    assert images.shape == (2, 120, 160, 3)
+    for image, state in zip(images, states):
+        assert (session.render(deepcopy(state), rgb=True) == image).all()
+
+    images = list(session.render_many([(deepcopy(states[0]), False, [80, 60]), deepcopy(states[1])]))
+    assert [image.shape for image in images] == [(60, 80, 4), (120, 160, 4)]
+
+
+def test_tiled_render(tmp_path):
+    session = RenderSession(resolution=[500, 300])
+    state = _create_state(3)
+    image = session.render(deepcopy(state), cache=False)
+    out = np.lib.format.open_memmap(str(tmp_path / "image.npy"), mode="w+", dtype=np.uint8, shape=(300, 500, 4))
+    tiled = session.render(deepcopy(state), out=out, tile_size=128, cache=False)
+    assert tiled is out
+    assert (np.abs(tiled.astype(int) - image) > 64).mean() < 0.01
+
+    filename = session.render_png(deepcopy(state), str(tmp_path / "graph"), tile_size=128)
+    png = QtGui.QImage(filename).convertToFormat(QtGui.QImage.Format.Format_RGBA8888)
+    assert (fn.ndarray_from_qimage(png) == tiled).all()
+
+
+def test_render_cache(tmp_path):
+    state = _create_state(2)
+    session = RenderSession(resolution=[200, 100])
+    cache = RenderCache(directory=str(tmp_path / "cache"))
+    image = session.render(deepcopy(state), cache=cache)
+    assert cache.stats() == dict(hits=0, misses=1, size=1)
+    cached = session.render(deepcopy(state), cache=cache)
+    assert cache.hits == 1 and (cached == image).all()
+
+    # The cached image is never handed out, so images can be modified
+    assert cached is not image and cached.flags.writeable and image.flags.writeable
+    cached[...] = 0
+    assert (session.render(deepcopy(state), cache=cache) == image).all()
+    assert "EAGERX_GUI_RENDER_CACHE" in os.environ or get_render_cache() is None
+
+    # Positions and line styles that are added to a state by rendering it do not change its key
+    same, memory = deepcopy(state), RenderCache()
+    for _ in range(3):
+        assert (session.render(same, cache=memory) == image).all()
+        assert same["gui_state"]["obj0"]["pos"] is not None
+    assert memory.stats() == dict(hits=2, misses=1, size=1)
+
+    # Other parameters or another state are rendered again
+    session.render(deepcopy(state), cache=cache, resolution=[100, 100])
+    changed = deepcopy(state)
+    changed["gui_state"]["obj0"] = dict(pos=[0, 500], linestyle=dict())
+    session.render(changed, cache=cache)
+    assert cache.stats() == dict(hits=2, misses=3, size=3)
+
+    # The svg is cached as well, and images are loaded from the directory in other processes
+    session.render(deepcopy(state), cache=cache, filename=str(tmp_path / "graph"))
+    other = RenderCache(directory=str(tmp_path / "cache"))
+    out = np.zeros_like(image)
+    assert session.render(deepcopy(state), cache=other, filename=str(tmp_path / "other"), out=out) is out
+    assert other.stats() == dict(hits=1, misses=0, size=1)
+    assert (out == image).all()
+    assert (tmp_path / "other.svg").read_bytes() == (tmp_path / "graph.svg").read_bytes()
+
+
+def test_svg(tmp_path):
+    state = _create_state(2)
+    state["gui_state"]["env/observations"] = dict(linestyle={"inputs/obs1": "line"})
+    filename = write_svg(state, str(tmp_path / "graph"))
+    svg = (tmp_path / "graph.svg").read_text()
+    assert filename.endswith("graph.svg")
+    assert all(f">{name}</text>" in svg for name in state["nodes"].keys())
+    assert svg.count("<path") == len(state["connects"]) and svg.count(" L ") == 1
+
+    # Same geometry as the nodes and terminals in the Gui. The text widths are only exact if its font is DejaVu Sans at 12 px.
+    session = RenderSession(resolution=[400, 300])
+    session.render(deepcopy(state), cache=False)
+    font = QtGui.QFontInfo(QtWidgets.QGraphicsTextItem().font())
+    rtol, atol = (0.0, 1e-6) if (font.family(), font.pixelSize()) == ("DejaVu Sans", 12) else (0.3, 10.0)
+    for name, node in session.gui.nodes.items():
+        inputs, outputs = get_terminals(state["nodes"][name]["config"], get_node_type(state, name))
+        width, height, anchors = get_node_geometry(name, inputs, outputs)
+        bounds = node.graphics_item().bounds
+        assert np.allclose((width, height), (bounds.width(), bounds.height()), rtol=rtol, atol=atol)
+        assert set(anchors.keys()) == set(node.terminals.keys())
+        for terminal_name, terminal in node.terminals.items():
+            point = terminal.graphics_item().connect_point() - node.graphics_item().pos()
+            expected = _connect_point(dict(x=0, y=0, anchors=anchors), terminal_name)
+            assert np.allclose(expected, (point.x(), point.y()), rtol=rtol, atol=atol)
+
+    # Qt is not imported
+    code = "import sys, eagerx_gui.svg; assert not [m for m in sys.modules if m.startswith(('PyQt', 'pyqtgraph'))]"
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_async_renderer(tmp_path):
+    states = [_create_state(1), _create_state(2)]
+    with AsyncRenderer(resolution=[200, 100]) as renderer:
+        futures = [renderer.submit(deepcopy(state), cache=False) for state in states]
+        out = np.zeros((50, 80, 3), dtype=np.uint8)
+        assert renderer.submit(deepcopy(states[0]), resolution=[80, 50], rgb=True, out=out, cache=False).result() is out
+        invalid = renderer.submit(dict(nodes=dict()), cache=False)
+
+        async def render():
+            return await renderer.render_async(deepcopy(states[1]), filename=str(tmp_path / "graph"), cache=False)
+
+        image = asyncio.run(render())
+        images = [future.result(timeout=60) for future in futures]
+        assert invalid.exception() is not None
+
+    session = RenderSession(resolution=[200, 100])
+    for state, image in zip(states, images):
+        assert (session.render(deepcopy(state), cache=False) == image).all()
+    assert (images[1] == image).all() and (tmp_path / "graph.svg").exists()
+    assert (out == session.render(deepcopy(states[0]), resolution=[80, 50], rgb=True, cache=False)).all()
+
+    # Renders that are submitted after the worker stopped fail right away
+    with AsyncRenderer(resolution=[200, 100]) as renderer:
+        assert renderer.wait_ready(timeout=60)
+        renderer._process.terminate()
+        renderer._thread.join(timeout=60)
+        future = renderer.submit(deepcopy(states[0]), cache=False)
+        assert future.done() and isinstance(future.exception(), RuntimeError)
@@ -0,0 +1,229 @@
+import json
+import random
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+
+import networkx as nx
+import numpy as np
+
+from eagerx_gui.benchmark import GENERATORS, run_benchmark
+from eagerx_gui.cache import LayoutCache
+from eagerx_gui.layout import force_layout
+from eagerx_gui.utils import (
+    add_pos_to_state,
+    get_adjacency,
+    get_connected_nodes,
+    get_longest_shortest_simple_paths,
+    is_connected_to_fixed,
+)
+
+
+def _reference_longest_shortest_simple_paths(state, fixed_nodes):
+    # Original implementation based on enumerating all simple paths.
+    G = nx.DiGraph()
+    longest_shortest_simple_paths = {}
+    for node in state["nodes"].keys():
+        G.add_node(node)
+    for source, target in state["connects"]:
+        G.add_edge(source[0], target[0])
+    for source in fixed_nodes:
+        longest_shortest_simple_path = []
+        if source not in state["nodes"].keys():
+            continue
+        for target in state["nodes"].keys():
+            if source == target or ("env/observations" in [source, target] and "env/render" in [source, target]):
+                continue
+            if nx.has_path(G, source=source, target=target):
+                shortest_path_len = len(state["nodes"].keys())
+                shortest_path = []
+                for simple_path in nx.all_simple_paths(G, source=source, target=target):
+                    if len(simple_path) < shortest_path_len:
+                        shortest_path = simple_path
+                        shortest_path_len = len(shortest_path)
+                if shortest_path_len > len(longest_shortest_simple_path):
+                    longest_shortest_simple_path = shortest_path
+        longest_shortest_simple_paths[source] = longest_shortest_simple_path
+    return longest_shortest_simple_paths
+
+
+def _random_state(rng, num_nodes, num_connects):
+    names = ["env/actions", "env/observations", "env/render"] + [f"node_{i}" for i in range(num_nodes)]
+    rng.shuffle(names)
+    connects = []
+    for i in range(num_connects):
+        source, target = rng.choice(names), rng.choice(names)
+        connects.append([[source, "outputs", f"out_{i}"], [target, "inputs", f"in_{i}"]])
+    return dict(nodes={name: dict(config=dict(name=name)) for name in names}, connects=connects, gui_state=dict())
+
+
+def test_longest_shortest_simple_paths():
+    rng = random.Random(0)
+    fixed_nodes = {"env/actions", "env/observations", "env/render"}
+    for _ in range(200):
+        state = _random_state(rng, num_nodes=rng.randint(0, 6), num_connects=rng.randint(0, 12))
+        expected = _reference_longest_shortest_simple_paths(state, fixed_nodes)
+        assert get_longest_shortest_simple_paths(state, fixed_nodes=fixed_nodes) == expected
+
+
+def test_adjacency():
+    rng = random.Random(1)
+    fixed_nodes = {"env/actions", "env/observations"}
+    for _ in range(50):
+        state = _random_state(rng, num_nodes=rng.randint(0, 8), num_connects=rng.randint(0, 12))
+        adjacency = get_adjacency(state)
+        G = nx.Graph()
+        G.add_nodes_from(state["nodes"])
+        for source, target in state["connects"]:
+            G.add_edge(source[0], target[0])
+        for node in state["nodes"]:
+            inputs = {s[0] for s, t in state["connects"] if t[0] == node and s[0] != node}
+            outputs = {t[0] for s, t in state["connects"] if s[0] == node}
+            assert get_connected_nodes(state, node, adjacency=adjacency) == (inputs, outputs)
+            reachable = set(nx.node_connected_component(G, node)) - {node}
+            assert is_connected_to_fixed(state, node, fixed_nodes, adjacency=adjacency) == bool(reachable & fixed_nodes)
+        add_pos_to_state(state)
+        for node in state["nodes"]:
+            assert len(state["gui_state"][node]["pos"]) == 2
+
+
+def test_layered_layout():
+    rng = random.Random(2)
+    for _ in range(50):
+        state = _random_state(rng, num_nodes=rng.randint(0, 10), num_connects=rng.randint(0, 20))
+        positions = []
+        for _ in range(2):
+            for node in state["gui_state"].values():
+                node["pos"] = None
+            add_pos_to_state(state, layout="layered", cache=False)
+            positions.append({node: gui_state["pos"] for node, gui_state in state["gui_state"].items()})
+        assert positions[0] == positions[1]
+        adjacency = get_adjacency(state)
+        fixed_nodes = {"env/actions", "env/observations", "env/render"}
+        main = {
+            n for n in state["nodes"] if n in fixed_nodes or is_connected_to_fixed(state, n, fixed_nodes, adjacency=adjacency)
+        }
+        x = {node: pos[0] for node, pos in positions[0].items() if node in main}
+        assert x["env/actions"] == min(x.values())
+        assert x["env/observations"] == x["env/render"] == max(x.values())
+        assert len({tuple(pos) for pos in positions[0].values()}) == len(positions[0])
+
+
+def test_layout_cache(tmp_path):
+    state = _random_state(random.Random(3), num_nodes=6, num_connects=10)
+    cache = LayoutCache(maxsize=1, directory=str(tmp_path), max_files=2)
+    add_pos_to_state(state, cache=cache)
+    positions = {node: gui_state.pop("pos") for node, gui_state in state["gui_state"].items()}
+    assert cache.stats() == dict(hits=0, misses=1, size=1)
+
+    # Only the node names and connections determine the key, so the same positions are applied
+    state["nodes"] = dict(reversed(state["nodes"].items()))
+    add_pos_to_state(state, cache=cache)
+    assert {node: gui_state["pos"] for node, gui_state in state["gui_state"].items()} == positions
+    assert cache.hits == 1
+
+    # Layouts are evicted from memory, but can still be loaded from disk by another cache
+    for layout in ["layered", "spring"]:
+        for gui_state in state["gui_state"].values():
+            gui_state["pos"] = None
+        add_pos_to_state(state, layout=layout, cache=cache)
+    assert len(cache) == 1 and len(list(tmp_path.iterdir())) == 2
+    for gui_state in state["gui_state"].values():
+        gui_state["pos"] = None
+    cache = LayoutCache(directory=str(tmp_path))
+    add_pos_to_state(state, layout="layered", cache=cache)
+    assert cache.stats() == dict(hits=1, misses=0, size=1)
+
+
+def test_incremental_layout():
+    state = _random_state(random.Random(4), num_nodes=8, num_connects=12)
+    add_pos_to_state(state, cache=False)
+    positions = {node: list(gui_state["pos"]) for node, gui_state in state["gui_state"].items()}
+
+    state["nodes"]["new_0"] = dict(config=dict(name="new_0"))
+    state["nodes"]["new_1"] = dict(config=dict(name="new_1"))
+    state["nodes"]["new_2"] = dict(config=dict(name="new_2"))
+    state["connects"].append([["env/actions", "outputs", "new"], ["new_0", "inputs", "new"]])
+    state["connects"].append([["new_1", "outputs", "new"], ["new_2", "inputs", "new"]])
+    add_pos_to_state(state, incremental=True, cache=False)
+    for node, pos in positions.items():
+        assert state["gui_state"][node]["pos"] == pos
+    new_positions = {node: state["gui_state"][node]["pos"] for node in ["new_0", "new_1", "new_2"]}
+    assert new_positions["new_0"][0] > positions["env/actions"][0]
+    assert new_positions["new_1"][1] > max(pos[1] for pos in positions.values())
+    assert new_positions["new_2"][0] > new_positions["new_1"][0]
+
+
+def test_force_layout():
+    G = nx.random_tree(30, seed=1)
+    pos = np.random.default_rng(0).random((30, 2)) * 200
+    pinned = np.zeros(30, dtype=bool)
+    pinned[[0, 1]] = True
+    expected = nx.spring_layout(G, k=225, pos=dict(enumerate(pos)), fixed=[0, 1], iterations=50, threshold=1e-4)
+    expected = np.array([expected[node] for node in range(30)])
+    assert np.allclose(force_layout(pos, list(G.edges()), k=225, pinned=pinned, method="exact"), expected)
+
+    # Clusters do not interact, so laying out a batch equals laying out each cluster separately
+    clusters = np.repeat([0, 1], 30)
+    edges = list(G.edges()) + [(source + 30, target + 30) for source, target in G.edges()]
+    batch = force_layout(np.concatenate([pos, pos]), edges, clusters=clusters, pinned=np.concatenate([pinned, pinned]))
+    assert np.allclose(batch[:30], batch[30:])
+    grid = force_layout(pos, list(G.edges()), pinned=pinned, method="grid")
+    assert np.all(grid[pinned] == pos[pinned]) and np.all(np.isfinite(grid))
+
+    state = _random_state(random.Random(5), num_nodes=20, num_connects=20)
+    add_pos_to_state(state, layout="force", cache=False)
+    for node in state["nodes"]:
+        assert len(state["gui_state"][node]["pos"]) == 2
+
+    # Prescribed positions are never changed, not even by rounding errors
+    rng = random.Random(6)
+    for _ in range(20):
+        state = _random_state(rng, num_nodes=20, num_connects=20)
+        prescribed = {
+            name: [rng.uniform(-1000, 1000), rng.uniform(-1000, 1000)] for name in rng.sample(list(state["nodes"]), 8)
+        }
+        state["gui_state"] = {name: dict(pos=list(pos), linestyle=dict()) for name, pos in prescribed.items()}
+        add_pos_to_state(state, layout="force", cache=False)
+        assert {name: state["gui_state"][name]["pos"] for name in prescribed} == prescribed
+
+
+def test_benchmark():
+    for generator in GENERATORS.values():
+        for is_engine in [False, True]:
+            state = generator(12, is_engine=is_engine)
+            adjacency = get_adjacency(state)
+            assert len(state["nodes"]) == 14 and set(adjacency.keys()) == set(state["nodes"].keys())
+    report = run_benchmark(sizes=[5], layouts=["spring", "force", "layered"], is_engine=True)
+    phases = {result["phase"] for result in report["results"]}
+    assert phases == {"adjacency", "longest_paths", "layout/spring", "layout/force", "layout/layered"}
+    assert len(report["results"]) == 5 * len(GENERATORS)
+    assert all(result["time"] >= 0 and result["peak_memory"] > 0 for result in report["results"])
+
+    # The workers are used by the "spring" layout, and recorded in the report
+    class Executor(ThreadPoolExecutor):
+        def map(self, *args, **kwargs):
+            self.num_maps = getattr(self, "num_maps", 0) + 1
+            return super().map(*args, **kwargs)
+
+    with Executor(max_workers=2) as executor:
+        report = run_benchmark(sizes=[5], generators=["clusters"], layouts=["spring"], workers=executor)
+    assert executor.num_maps > 0
+    assert all(result["workers"] == "Executor" for result in report["results"])
+    json.dumps(report)
+
+
+def test_parallel_spring_layout():
+    state = GENERATORS["clusters"](41)
+    serial = add_pos_to_state(deepcopy(state), cache=False)
+    parallel = add_pos_to_state(deepcopy(state), cache=False, workers=2)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        shared = add_pos_to_state(deepcopy(state), cache=False, workers=executor)
+
+    # Loose clusters are stacked in the same order, whether laid out in parallel or not
+    for result in [serial, parallel, shared]:
+        first_nodes = [f"node_{i}" for i in range(1, 41, 5)]
+        heights = [result["gui_state"][node]["pos"][1] for node in first_nodes]
+        assert heights == sorted(heights)
+        assert all(len(result["gui_state"][node]["pos"]) == 2 for node in state["nodes"])
+    for node in ["env/actions", "env/observations", "node_0"]:
+        assert serial["gui_state"][node]["pos"] == parallel["gui_state"][node]["pos"]